@@ -0,0 +1,193 @@
+"""
+Admission control: per-route concurrency limits with bounded wait queues.
+
+Each route belongs to a pool. A pool runs up to `limit` requests at once and
+queues up to `queue` more, each for at most `timeout` seconds. Requests that
+find the queue full, or wait too long, get an immediate 503 with Retry-After
+instead of piling up behind bcrypt or image processing.
+
+Cheap reads have their own pool, so a signup or upload burst can't take their
+slots, and image files are served from another, so a page full of images can't
+take them either. Heavy pools should also leave database connections for reads, so keep
+their limits together below DB_POOL_SIZE + DB_MAX_OVERFLOW. Limits are set with
+ADMISSION_<POOL>_LIMIT, ADMISSION_<POOL>_QUEUE and ADMISSION_<POOL>_TIMEOUT,
+for example ADMISSION_AUTH_LIMIT=8. ADMISSION_CONTROL=off disables all of it.
+"""
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from metrics import route_template
+from passwords import PASSWORD_HASH_WORKERS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "on").lower() not in ("0", "off", "false", "no")
+
+# Seconds clients are told to wait before retrying a shed request
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Pool -> (limit, queue, timeout seconds) unless overridden from the environment
+DEFAULT_POOLS: Dict[str, Tuple[int, int, float]] = {
+    # bcrypt: a short backlog per hashing worker keeps the pool busy, not flooded
+    "auth": (2 * PASSWORD_HASH_WORKERS, 8 * PASSWORD_HASH_WORKERS, 2.0),
+    # Image decoding, re-encoding and writes
+    "uploads": (4, 16, 5.0),
+    # Cached or single-index reads, reserved so they stay responsive under overload
+    "reads": (64, 256, 1.0),
+    # Uploaded image files: no database, but many per page view
+    "images": (32, 256, 1.0),
+    # Everything else
+    "default": (16, 64, 2.0),
+}
+
+# (method, route template) -> pool; other routes use "default"
+ROUTE_POOLS: Dict[Tuple[str, str], str] = {
+    ("POST", "/signup"): "auth",
+    ("POST", "/login"): "auth",
+    ("POST", "/google-login"): "auth",
+    ("POST", "/google-signup"): "auth",
+    ("POST", "/products"): "uploads",
+    ("PUT", "/products/{product_id}"): "uploads",
+    ("POST", "/products/import"): "uploads",
+    ("GET", "/products"): "reads",
+    ("GET", "/products/{product_id}"): "reads",
+    ("POST", "/ads"): "reads",
+    ("GET", "/uploads/{file_path:path}"): "images",
+    ("HEAD", "/uploads/{file_path:path}"): "images",
+}
+
+# Probes and monitoring are never queued or shed
+EXEMPT_ROUTES = {"/healthz", "/readyz", "/metrics", "/stats"}
+
+class Pool:
+    """
+    Concurrency limit with a bounded FIFO queue. A released slot is handed
+    directly to the oldest waiter, so queued requests can't be overtaken.
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, timeout: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue = max(0, queue)
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        # Metrics
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_queue_depth = 0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed; False if the request should be shed"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timed_out += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter; active is unchanged
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "queue_limit": self.queue,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+class AdmissionController:
+    def __init__(self, pools: Dict[str, Tuple[int, int, float]], routes: Dict[Tuple[str, str], str]):
+        self.pools = {name: Pool(name, *config) for name, config in pools.items()}
+        self.routes = routes
+
+    def pool_for(self, method: str, route: str) -> Optional[Pool]:
+        if method == "OPTIONS" or route in EXEMPT_ROUTES:
+            return None
+        return self.pools[self.routes.get((method, route), "default")]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+def _pool_config(name: str, defaults: Tuple[int, int, float]) -> Tuple[int, int, float]:
+    limit, queue, timeout = defaults
+    prefix = f"ADMISSION_{name.upper()}"
+    return (
+        int(os.getenv(f"{prefix}_LIMIT", str(limit))),
+        int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),
+    )
+
+admission = AdmissionController(
+    {name: _pool_config(name, defaults) for name, defaults in DEFAULT_POOLS.items()},
+    ROUTE_POOLS,
+)
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController = admission, enabled: bool = ADMISSION_CONTROL):
+        self.app = app
+        self.controller = controller
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        pool = self.controller.pool_for(scope["method"], route_template(scope))
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await pool.acquire():
+            # Counted in the pool's stats; a log line per shed request would flood under overload
+            logger.debug(f"Shed {scope['method']} {scope['path']}: {pool.name} pool is saturated")
+            response = ORJSONResponse(
+                {"detail": "Server is busy, please retry"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
@@ -0,0 +1,68 @@
+"""
+Facet counts and filtered listing latency as the catalog grows (SQLite).
+
+    python benchmarks/bench_facets.py 10000 100000 1000000
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from datagen import seed  # noqa: E402
+from sqlalchemy import create_engine, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from models import Product  # noqa: E402
+from pagination import keyset  # noqa: E402
+from search import ensure_search_index, facet_counts, product_filters  # noqa: E402
+
+RUNS = 20
+
+CASES = {
+    "facets_unfiltered": {},
+    "facets_category": {"category": "furniture"},
+    "facets_category_price": {"category": "furniture", "min_price": 1000, "max_price": 5000},
+    "facets_city_type_size": {"city": "Lahore", "type": "used", "size": "M"},
+}
+
+async def timed(fn, runs=RUNS):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(statistics.median(samples), 3), "max_ms": round(max(samples), 3)}
+
+async def bench(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    seed(engine, rows)
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+        connection.execute(text("ANALYZE"))
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    results = {}
+    async with AsyncSession(async_engine) as db:
+        for name, params in CASES.items():
+            filters = product_filters(**params)
+            results[name] = await timed(lambda: facet_counts(db, filters))
+
+            query = keyset(select(Product).where(*filters.values()), (Product.id,)).limit(20)
+            results[name.replace("facets", "page")] = await timed(lambda: db.scalars(query))
+    await async_engine.dispose()
+    return results
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = asyncio.run(bench(os.path.join(tmp, "bench.db"), rows))
+        print(json.dumps({"rows": rows, "results": results}))
+
+if __name__ == "__main__":
+    main()
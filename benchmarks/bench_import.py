@@ -0,0 +1,97 @@
+"""
+Bulk import throughput (SQLite): an NDJSON manifest of N products sharing a
+small set of distinct images, imported through bulk_import.import_products.
+
+    python benchmarks/bench_import.py 10000 100000
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import zipfile
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from datagen import CATEGORIES, CITIES, SIZES, TYPES, WORDS  # noqa: E402
+from PIL import Image  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+
+DISTINCT_IMAGES = 200
+
+def write_archive(path: str, rng: random.Random):
+    with zipfile.ZipFile(path, "w") as archive:
+        for i in range(DISTINCT_IMAGES):
+            buffer = io.BytesIO()
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new("RGB", (640, 480), color).save(buffer, "JPEG")
+            archive.writestr(f"img_{i}.jpg", buffer.getvalue())
+
+def write_manifest(path: str, rows: int, rng: random.Random):
+    with open(path, "w") as f:
+        for _ in range(rows):
+            f.write(json.dumps({
+                "title": " ".join(rng.choice(WORDS) for _ in range(3)),
+                "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+                "city": rng.choice(CITIES),
+                "location": f"Block {rng.randint(1, 20)}",
+                "return_policy": "7 days",
+                "size": rng.choice([size for size in SIZES if size]),
+                "type": rng.choice(TYPES),
+                "price": round(rng.uniform(100, 100_000), 2),
+                "category": rng.choice(CATEGORIES),
+                "images": [f"img_{rng.randrange(DISTINCT_IMAGES)}.jpg" for _ in range(rng.randint(1, 3))],
+            }) + "\n")
+
+async def bench(tmp: str, rows: int):
+    from models import Base, User
+    from search import ensure_search_index
+    from bulk_import import ImageArchive, import_products, read_manifest
+
+    rng = random.Random(42)
+    manifest_path = os.path.join(tmp, "products.ndjson")
+    archive_path = os.path.join(tmp, "images.zip")
+    write_manifest(manifest_path, rows, rng)
+    write_archive(archive_path, rng)
+
+    db_path = os.path.join(tmp, "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+        connection.execute(insert(User), [{"id": 1, "username": "seller", "password": "!", "email": "s@example.com", "contact_no": ""}])
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    start = time.perf_counter()
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        with open(manifest_path, "rb") as manifest, open(archive_path, "rb") as archive_file:
+            report = await import_products(db, read_manifest(manifest, "ndjson"), ImageArchive(archive_file), 1, variants=False)
+    elapsed = time.perf_counter() - start
+    await async_engine.dispose()
+    return {
+        "imported": report["imported"],
+        "failed": report["failed"],
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(report["imported"] / elapsed),
+    }
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000]
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Images are stored under ./uploads; keep them out of the working tree
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                results = asyncio.run(bench(tmp, rows))
+            finally:
+                os.chdir(cwd)
+        print(json.dumps({"rows": rows, "results": results}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Listing pages of 10,000 rows (SQLite): full Product entities (joined owner,
+selectin images) serialized with product_json, versus the column projection in
+listings.py serialized with product_listing_json. Reports latency and the peak
+Python memory allocated while building each page.
+
+    python benchmarks/bench_listing.py [page_size]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from datagen import seed  # noqa: E402
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from models import Product  # noqa: E402
+from listings import fetch_listings, listing_query  # noqa: E402
+from serializers import product_json, product_listing_json  # noqa: E402
+
+RUNS = 10
+
+async def orm_page(db: AsyncSession, size: int):
+    products = (await db.scalars(select(Product).order_by(Product.id).limit(size))).all()
+    return [product_json(product) for product in products]
+
+async def projected_page(db: AsyncSession, size: int):
+    listings = await fetch_listings(db, listing_query().order_by(Product.id).limit(size))
+    return [product_listing_json(listing) for listing in listings]
+
+async def measure(engine, page, size: int):
+    samples = []
+    peaks = []
+    for _ in range(RUNS):
+        # A fresh session per page, as per request
+        async with AsyncSession(engine) as db:
+            tracemalloc.start()
+            start = time.perf_counter()
+            await page(db, size)
+            samples.append((time.perf_counter() - start) * 1000)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 2**20)
+            tracemalloc.stop()
+    # Latency without tracemalloc overhead
+    timings = []
+    for _ in range(RUNS):
+        async with AsyncSession(engine) as db:
+            start = time.perf_counter()
+            await page(db, size)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "peak_mib": round(statistics.median(peaks), 1),
+    }
+
+async def bench(path: str, size: int):
+    engine = create_engine(f"sqlite:///{path}")
+    seed(engine, size * 2, images_per_product=3)
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    results = {
+        "orm_entities": await measure(async_engine, orm_page, size),
+        "column_projection": await measure(async_engine, projected_page, size),
+    }
+    await async_engine.dispose()
+    for metric in ("p50_ms", "peak_mib"):
+        results[f"{metric}_ratio"] = round(
+            results["orm_entities"][metric] / results["column_projection"][metric], 1
+        )
+    return results
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(bench(os.path.join(tmp, "bench.db"), size))
+    print(json.dumps({"page_size": size, "results": results}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+First page (20 nearest products) of a radius search around central Lahore as the
+catalog grows (SQLite), at several radii. Reports the median latency of
+geo.nearest (expanding circles) and of sorting every product within the radius,
+how many products lie within it, and whether SQLite reads ix_products_geohash.
+
+    python benchmarks/bench_nearby.py [products ...]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from datagen import seed  # noqa: E402
+from sqlalchemy import create_engine, func, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from models import Product  # noqa: E402
+from geo import distance_key, nearest, within_radius  # noqa: E402
+
+LATITUDE, LONGITUDE = 31.5204, 74.3587
+RADII_KM = (1, 5, 25)
+PAGE_SIZE = 20
+RUNS = 20
+
+def page_query(radius_km: float):
+    distance = distance_key(LATITUDE, LONGITUDE)
+    return (
+        select(Product.id, distance.label("distance"))
+        .where(within_radius("sqlite", LATITUDE, LONGITUDE, radius_km))
+        .order_by(distance, Product.id)
+        .limit(PAGE_SIZE + 1)
+    )
+
+async def measure(engine, radius_km: float) -> dict:
+    query = page_query(radius_km)
+    expanding = []
+    whole_radius = []
+    async with AsyncSession(engine) as db:
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            await nearest(db, LATITUDE, LONGITUDE, radius_km, PAGE_SIZE + 1)
+            expanding.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            (await db.execute(query)).all()
+            whole_radius.append((time.perf_counter() - start) * 1000)
+        within = await db.scalar(
+            select(func.count()).where(within_radius("sqlite", LATITUDE, LONGITUDE, radius_km))
+        )
+        plan = await db.execute(text(
+            "EXPLAIN QUERY PLAN " + str(query.compile(compile_kwargs={"literal_binds": True}))
+        ))
+        uses_index = any("ix_products_geohash" in row[-1] for row in plan)
+    return {
+        "expanding_p50_ms": round(statistics.median(expanding), 2),
+        "whole_radius_p50_ms": round(statistics.median(whole_radius), 2),
+        "within_radius": within,
+        "uses_index": uses_index,
+    }
+
+async def bench(path: str, products: int) -> dict:
+    engine = create_engine(f"sqlite:///{path}")
+    seed(engine, products)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    results = {f"{radius}km": await measure(async_engine, radius) for radius in RADII_KM}
+    await async_engine.dispose()
+    return results
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            results[size] = asyncio.run(bench(os.path.join(tmp, f"bench_{size}.db"), size))
+    print(json.dumps({"page_size": PAGE_SIZE, "results": results}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Serialization cost of 1,000-item listings: FastAPI's response_model path
+(pydantic validation + jsonable_encoder + json) versus the serializers in
+serializers.py rendered by ORJSONResponse. No database involved.
+
+    python benchmarks/bench_serialization.py [items]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import datetime
+import statistics
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from models import Product, ProductImage, User  # noqa: E402
+from schemas import ProductResponse, UserResponse  # noqa: E402
+from serializers import product_json, user_json  # noqa: E402
+from thumbnails import variant_urls  # noqa: E402
+
+RUNS = 30
+
+def make_products(count: int) -> List[Product]:
+    return [
+        Product(
+            id=i,
+            title=f"Wooden chair {i}",
+            description="Solid oak, barely used",
+            category="furniture",
+            price=1000.0 + i,
+            type="used",
+            user_id=1,
+            images=[
+                ProductImage(position=n, path=f"uploads/ab/{i:064x}.jpeg", url=f"/uploads/ab/{i:064x}.jpeg")
+                for n in range(3)
+            ],
+        )
+        for i in range(count)
+    ]
+
+def make_users(count: int) -> List[User]:
+    return [
+        User(
+            id=i,
+            username=f"user_{i}",
+            email=f"user_{i}@example.com",
+            rating=4.5,
+            joining_date=datetime.datetime(2024, 1, 1),
+            contact_no="03001234567",
+        )
+        for i in range(count)
+    ]
+
+def product_model(product: Product) -> ProductResponse:
+    # What handlers built before serializers.py: a validated model per row
+    images = [image.url for image in product.images]
+    return ProductResponse(
+        id=product.id,
+        title=product.title,
+        images=images,
+        variants=[variant_urls(url) for url in images],
+        category=product.category,
+        price=product.price,
+        type=product.type,
+    )
+
+async def response_model_body(field, content) -> bytes:
+    # FastAPI's path for handlers that return data and declare response_model
+    value = await serialize_response(field=field, response_content=content)
+    return JSONResponse(value).body
+
+def timed(fn, runs=RUNS):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(statistics.median(samples), 3), "max_ms": round(max(samples), 3)}
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    products = make_products(count)
+    users = make_users(count)
+    product_field = create_model_field("Response", List[ProductResponse], mode="serialization")
+    user_field = create_model_field("Response", List[UserResponse], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    cases = {
+        "products_response_model": lambda: loop.run_until_complete(
+            response_model_body(product_field, [product_model(product) for product in products])
+        ),
+        "products_orjson_serializer": lambda: ORJSONResponse([product_json(product) for product in products]).body,
+        "users_response_model": lambda: loop.run_until_complete(response_model_body(user_field, users)),
+        "users_orjson_serializer": lambda: ORJSONResponse([user_json(user) for user in users]).body,
+    }
+    results = {name: timed(fn) for name, fn in cases.items()}
+    for kind in ("products", "users"):
+        before = results[f"{kind}_response_model"]["p50_ms"]
+        after = results[f"{kind}_orjson_serializer"]["p50_ms"]
+        results[f"{kind}_speedup"] = round(before / after, 1)
+    loop.close()
+    print(json.dumps({"items": count, "results": results}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Cold start of an API worker: time to import the app, then to answer the first
+request, each measured in a fresh interpreter against a migrated SQLite database.
+Also counts SQL statements run during import, which should be none: every one
+is a network round trip per worker on a real database.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import os
+import sys
+import json
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Runs in the child process; prints its timings as JSON
+CHILD = """
+import sys, time, json
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+queries = []
+event.listen(Engine, "before_cursor_execute", lambda *args: queries.append(1))
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import_queries = len(queries)
+from fastapi.testclient import TestClient
+client = TestClient(main.app)
+ready = time.perf_counter()
+assert client.get("/products?limit=20").status_code == 200
+first = time.perf_counter()
+assert client.get("/products?limit=20").status_code == 200
+second = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first - ready) * 1000,
+    "second_request_ms": (second - first) * 1000,
+    "import_queries": import_queries,
+}))
+"""
+
+def run_child(env, cwd):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "benchmarks")]),
+            CACHE_URL="none",
+        )
+        # Schema and a small catalog, set up once outside the timed runs
+        subprocess.run(
+            [sys.executable, "-c", "from db import get_engine; from datagen import seed; "
+             "from migrations import migrate; seed(get_engine(), 1000); migrate(get_engine())"],
+            env=env, cwd=tmp, check=True, capture_output=True,
+        )
+        samples = [run_child(env, tmp) for _ in range(runs)]
+
+    results = {
+        name: {
+            "p50_ms": round(statistics.median(sample[name] for sample in samples), 1),
+            "max_ms": round(max(sample[name] for sample in samples), 1),
+        }
+        for name in samples[0]
+        if name.endswith("_ms")
+    }
+    results["import_queries"] = max(sample["import_queries"] for sample in samples)
+    print(json.dumps({"runs": runs, "results": results}))
+
+if __name__ == "__main__":
+    main()
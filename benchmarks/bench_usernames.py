@@ -0,0 +1,86 @@
+"""
+Username allocation cost as the users table grows (SQLite): the old loop of one
+unindexed lookup per collision, versus allocate_username's single query on the
+unique index. Every table has COLLISIONS users already named "taken", "taken_1", ...
+
+    python benchmarks/bench_usernames.py [users ...]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from datagen import seed  # noqa: E402
+from sqlalchemy import create_engine, insert, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from models import User  # noqa: E402
+from usernames import allocate_username  # noqa: E402
+
+BASE = "taken"
+COLLISIONS = 20
+RUNS = 20
+
+async def loop_allocation(db: AsyncSession) -> str:
+    # What google_login/google_signup did before
+    username = BASE
+    counter = 1
+    while (await db.scalars(select(User).where(User.username == username))).first():
+        username = f"{BASE}_{counter}"
+        counter += 1
+    return username
+
+async def indexed_allocation(db: AsyncSession) -> str:
+    return await allocate_username(db, BASE)
+
+async def measure(engine, allocate) -> float:
+    timings = []
+    async with AsyncSession(engine) as db:
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            await allocate(db)
+            timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+def build(path: str, users: int, indexed: bool):
+    engine = create_engine(f"sqlite:///{path}")
+    seed(engine, 0, users)
+    with engine.begin() as connection:
+        if not indexed:
+            connection.execute(text("DROP INDEX ix_users_username"))
+        connection.execute(insert(User), [
+            {
+                "username": BASE if n == 0 else f"{BASE}_{n}",
+                "password": "!",
+                "email": f"{BASE}_{n}@example.com",
+                "contact_no": "",
+            }
+            for n in range(COLLISIONS)
+        ])
+    engine.dispose()
+
+async def bench(tmp: str, users: int) -> dict:
+    results = {}
+    for name, allocate, indexed in (
+        ("loop_unindexed", loop_allocation, False),
+        ("single_query_indexed", indexed_allocation, True),
+    ):
+        path = os.path.join(tmp, f"{name}_{users}.db")
+        build(path, users, indexed)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        results[f"{name}_p50_ms"] = await measure(engine, allocate)
+        await engine.dispose()
+    return results
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {size: asyncio.run(bench(tmp, size)) for size in sizes}
+    print(json.dumps({"collisions": COLLISIONS, "results": results}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Synthetic Bazaar data for benchmarks, built on the models in models.py
+
+As a script, builds a migrated SQLite database and its image files at a preset scale:
+
+    python benchmarks/datagen.py {10k,100k,1m} --out DIR [--images-per-product 3]
+
+DIR then holds bazaar.db, uploads/ and dataset.json, which describes the data for
+the load driver (benchmarks/loadtest.py). Run the API with DIR as working directory.
+"""
+import os
+import io
+import sys
+import json
+import random
+import hashlib
+import argparse
+import datetime
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert  # noqa: E402
+from models import Base, User, Product, ProductImage  # noqa: E402
+from geo import product_location  # noqa: E402
+
+CATEGORIES = ["furniture", "electronics", "clothing", "books", "toys", "sports", "decor", "vehicles"]
+CITIES = ["Lahore", "Karachi", "Islamabad", "Rawalpindi", "Faisalabad", "Multan", "Peshawar", "Quetta"]
+# City centres (latitude, longitude); products are scattered around them
+CITY_CENTRES = {
+    "Lahore": (31.5204, 74.3587),
+    "Karachi": (24.8607, 67.0011),
+    "Islamabad": (33.6844, 73.0479),
+    "Rawalpindi": (33.5651, 73.0169),
+    "Faisalabad": (31.4504, 73.1350),
+    "Multan": (30.1575, 71.5249),
+    "Peshawar": (34.0151, 71.5249),
+    "Quetta": (30.1798, 66.9750),
+}
+# Standard deviation of a product's distance from its city centre, in degrees (~10 km)
+CITY_SPREAD = 0.09
+TYPES = ["new", "used", "refurbished"]
+SIZES = ["XS", "S", "M", "L", "XL", None]
+WORDS = [
+    "wooden", "chair", "table", "mirror", "lamp", "phone", "laptop", "jacket", "shoes", "novel",
+    "bicycle", "football", "sofa", "vintage", "elegant", "modern", "classic", "large", "small", "wall",
+]
+
+BATCH_SIZE = 10_000
+
+# Catalog sizes (products); there is one user per 20 products
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Distinct image files on disk, shared by all products like real re-uploads would be
+DISTINCT_IMAGES = 500
+
+# Every generated user can log in with this password
+PASSWORD = "bench-password"
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def write_images(upload_dir: str, count: int = DISTINCT_IMAGES, seed: int = 42) -> List[str]:
+    """
+    Write `count` distinct JPEGs at their content-addressed paths under upload_dir.
+    Returns their paths relative to upload_dir's parent (uploads/ab/<sha256>.jpeg).
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new("RGB", (800, 600), color).save(buffer, "JPEG", quality=85)
+        data = buffer.getvalue()
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = os.path.join(upload_dir, sha256[:2], f"{sha256}.jpeg")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(f"uploads/{sha256[:2]}/{sha256}.jpeg")
+    return paths
+
+def seed(
+    engine,
+    products: int,
+    users: int = None,
+    seed: int = 42,
+    images_per_product: int = 1,
+    image_paths: Optional[List[str]] = None,
+    password_hash: str = "!",
+):
+    """
+    Create the schema and insert `products` products spread over `users` users.
+    Images point at image_paths when given, otherwise at files that don't exist.
+    """
+    rng = random.Random(seed)
+    # Locations come from their own stream so the other generated values don't change
+    location_rng = random.Random(seed + 1)
+    users = users or max(1, products // 20)
+
+    def location(city: str):
+        latitude, longitude = CITY_CENTRES[city]
+        return product_location(
+            latitude + location_rng.gauss(0, CITY_SPREAD), longitude + location_rng.gauss(0, CITY_SPREAD)
+        )
+
+    Base.metadata.create_all(bind=engine)
+
+    def image_path(product: int, position: int) -> str:
+        if image_paths:
+            return rng.choice(image_paths)
+        return f"uploads/20250101/{product}_{position}.jpeg" if position else f"uploads/20250101/{product}.jpeg"
+
+    with engine.begin() as connection:
+        for start in range(0, users, BATCH_SIZE):
+            connection.execute(insert(User), [
+                {
+                    "id": i + 1,
+                    "username": f"user_{i}",
+                    "password": password_hash,
+                    "email": f"user_{i}@example.com",
+                    "rating": round(rng.uniform(0, 5), 1),
+                    "joining_date": datetime.datetime(2024, 1, 1),
+                    "contact_no": "",
+                }
+                for i in range(start, min(start + BATCH_SIZE, users))
+            ])
+
+        for start in range(0, products, BATCH_SIZE):
+            rows = []
+            for i in range(start, min(start + BATCH_SIZE, products)):
+                row = {
+                    "id": i + 1,
+                    "title": _sentence(rng, 3),
+                    "description": _sentence(rng, 12),
+                    "city": rng.choice(CITIES),
+                    "location": f"Block {rng.randint(1, 20)}",
+                    "return_policy": "7 days",
+                    "size": rng.choice(SIZES),
+                    "type": rng.choice(TYPES),
+                    "price": round(rng.uniform(100, 100_000), 2),
+                    "category": rng.choice(CATEGORIES),
+                    "user_id": rng.randint(1, users),
+                }
+                row.update(location(row["city"]))
+                rows.append(row)
+            connection.execute(insert(Product), rows)
+            images = []
+            for i in range(start, min(start + BATCH_SIZE, products)):
+                for position in range(images_per_product):
+                    path = image_path(i, position)
+                    images.append({
+                        "product_id": i + 1,
+                        "position": position,
+                        "path": path,
+                        "url": f"/{path}",
+                        "width": 800 if image_paths else 1280,
+                        "height": 600 if image_paths else 960,
+                    })
+            connection.execute(insert(ProductImage), images)
+
+def build(out: str, scale: str, images_per_product: int = 3, seed_value: int = 42) -> dict:
+    """Generate a dataset directory for the load driver; returns its description"""
+    from sqlalchemy import create_engine, text
+    from migrations import migrate
+    from passwords import pwd_context
+
+    os.makedirs(out, exist_ok=True)
+    database = os.path.join(os.path.abspath(out), "bazaar.db")
+    if os.path.exists(database):
+        os.remove(database)
+
+    products = SCALES[scale]
+    users = max(1, products // 20)
+    image_paths = write_images(os.path.join(out, "uploads"), seed=seed_value)
+
+    engine = create_engine(f"sqlite:///{database}")
+    seed(
+        engine, products, users, seed_value,
+        images_per_product=images_per_product,
+        image_paths=image_paths,
+        # bcrypt is slow on purpose: hash once and share it
+        password_hash=pwd_context.hash(PASSWORD),
+    )
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    engine.dispose()
+
+    dataset = {
+        "scale": scale,
+        "products": products,
+        "users": users,
+        "images_per_product": images_per_product,
+        "database_url": f"sqlite:///{database}",
+        "image_urls": [f"/{path}" for path in image_paths],
+        "password": PASSWORD,
+        "email_pattern": "user_{}@example.com",
+    }
+    with open(os.path.join(out, "dataset.json"), "w") as f:
+        json.dump(dataset, f)
+    return dataset
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a benchmark dataset")
+    parser.add_argument("scale", choices=sorted(SCALES))
+    parser.add_argument("--out", required=True, help="Directory for bazaar.db, uploads/ and dataset.json")
+    parser.add_argument("--images-per-product", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    dataset = build(args.out, args.scale, args.images_per_product, args.seed)
+    print(json.dumps({key: value for key, value in dataset.items() if key != "image_urls"}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Load driver for the Bazaar API: runs each scenario for a fixed time at a fixed
+concurrency against a server on localhost and reports latency percentiles and
+throughput as JSON, so releases can be compared before they are deployed.
+
+    python benchmarks/datagen.py 100k --out /tmp/bazaar-100k
+    python benchmarks/loadtest.py --data /tmp/bazaar-100k [--concurrency 32] [--duration 15]
+        [--scenarios products,product,ads,login,image] [--workers 1] [--output results.json]
+
+Without --url, a uvicorn server for this checkout is started on a free port with the
+dataset directory as working directory. With --url, an already running server is
+used; it must serve the same dataset. Set CACHE_URL=none to measure without the
+response cache. The client runs in one process, so keep an eye on its CPU at high
+concurrency: the numbers are only meaningful while the server is the bottleneck.
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from typing import Callable, Dict, List, NamedTuple
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    json: dict = None
+
+def scenarios(dataset: dict) -> Dict[str, Callable[[random.Random], Request]]:
+    """Request generators per scenario, drawing ids uniformly from the dataset"""
+    products = dataset["products"]
+    users = dataset["users"]
+
+    def products_page(rng):
+        params = ["limit=20", f"sort={rng.choice(['id', 'price', 'newest'])}"]
+        if rng.random() < 0.5:
+            params.append(f"category={rng.choice(['furniture', 'electronics', 'clothing', 'books'])}")
+        return Request("GET", "/products?" + "&".join(params))
+
+    return {
+        "products": products_page,
+        "product": lambda rng: Request("GET", f"/products/{rng.randint(1, products)}"),
+        "ads": lambda rng: Request("POST", "/ads", {"id": rng.randint(1, users), "limit": 20}),
+        "login": lambda rng: Request("POST", "/login", {
+            "email": dataset["email_pattern"].format(rng.randrange(users)),
+            "password": dataset["password"],
+        }),
+        "image": lambda rng: Request("GET", rng.choice(dataset["image_urls"])),
+    }
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, math.ceil(q / 100 * len(samples)) - 1))
+    return samples[rank]
+
+async def run_scenario(client: httpx.AsyncClient, make_request, concurrency: int, duration: float, warmup: float, seed: int):
+    latencies: List[float] = []
+    errors = 0
+    statuses: Dict[int, int] = {}
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    async def worker(n: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + n)
+        while True:
+            request = make_request(rng)
+            sent = time.perf_counter()
+            if sent >= deadline:
+                return
+            try:
+                response = await client.request(request.method, request.path, json=request.json)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            finished = time.perf_counter()
+            if sent < measure_from:
+                continue
+            latencies.append(finished - sent)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 0 or status >= 400:
+                errors += 1
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    latencies.sort()
+    elapsed = min(time.perf_counter(), deadline) - measure_from
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(dataset_dir: str, dataset: dict, workers: int):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=dataset["database_url"],
+        PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=dataset_dir, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with status {server.returncode}")
+        try:
+            if httpx.get(f"{url}/readyz", timeout=1).status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("Server didn't become ready")
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args, dataset: dict, url: str) -> dict:
+    available = scenarios(dataset)
+    selected = args.scenarios.split(",") if args.scenarios else list(available)
+    unknown = set(selected) - set(available)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        for n, name in enumerate(selected):
+            results[name] = await run_scenario(
+                client, available[name], args.concurrency, args.duration, args.warmup, args.seed + n
+            )
+            print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Bazaar API")
+    parser.add_argument("--data", required=True, help="Dataset directory from benchmarks/datagen.py")
+    parser.add_argument("--url", help="Use a running server instead of starting one")
+    parser.add_argument("--scenarios", help="Comma-separated subset of products,product,ads,login,image")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the server")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.data, "dataset.json")) as f:
+        dataset = json.load(f)
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(os.path.abspath(args.data), dataset, args.workers)
+    try:
+        results = asyncio.run(run(args, dataset, url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "scale": dataset["scale"],
+        "products": dataset["products"],
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "workers": args.workers if server is not None else None,
+        "cache": os.getenv("CACHE_URL", "memory://"),
+        "results": results,
+    }
+    output = json.dumps(report)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
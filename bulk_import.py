@@ -0,0 +1,319 @@
+"""
+Bulk product import: a CSV or NDJSON manifest plus a zip archive of the images it references.
+
+Each manifest row has the fields of ProductCreate. `images` lists archive member
+names: a JSON array in NDJSON, "|"-separated in CSV. Rows are validated and their
+images stored in batches off the event loop, then each batch is inserted with
+executemany statements and committed on its own. Invalid rows are skipped and
+reported; they never fail the rest of the import.
+
+    python bulk_import.py products.csv --images images.zip --user-id 3
+"""
+import io
+import os
+import csv
+import json
+import sys
+import logging
+import zipfile
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from models import Product, ProductImage
+from geo import product_location
+from schemas import ProductCreate
+from uploads import ByteBudget, StoredImage, acquire_images, discard_images, public_url, rewrite_image, store_image
+from cache import response_cache
+from thumbnails import thumbnail_queue
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows inserted and committed per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+# Optional ProductCreate fields that CSV manifests may leave empty
+LOCATION_FIELDS = ("latitude", "longitude")
+
+MANIFEST_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# (row number, parsed values or None, parse error or None)
+ManifestRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+def manifest_format(filename: Optional[str], format: Optional[str] = None) -> str:
+    """Pick the manifest format from an explicit value or the file extension"""
+    if format:
+        return format
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in MANIFEST_FORMATS:
+        raise ValueError("Manifest must be a .csv or .ndjson file")
+    return MANIFEST_FORMATS[extension]
+
+def read_manifest(source: BinaryIO, format: str) -> Iterator[ManifestRow]:
+    """
+    Lazily parse manifest rows, numbered from 1. Malformed lines are yielded with an error.
+    """
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        for row_number, values in enumerate(csv.DictReader(text), start=1):
+            if None in values:
+                yield row_number, None, "Row has more columns than the header"
+                continue
+            images = values.get("images") or ""
+            values["images"] = [name.strip() for name in images.split("|") if name.strip()]
+            # Empty cells for the optional location mean no location
+            for name in LOCATION_FIELDS:
+                if values.get(name) == "":
+                    values[name] = None
+            yield row_number, values, None
+    elif format == "ndjson":
+        row_number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                values = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {str(e)}"
+                continue
+            if not isinstance(values, dict):
+                yield row_number, None, "Row must be a JSON object"
+                continue
+            yield row_number, values, None
+    else:
+        raise ValueError(f"Unsupported manifest format: {format}")
+
+class ImageArchive:
+    """
+    Images of an import, stored content-addressed on first use and remembered by member name
+    """
+
+    def __init__(self, source: BinaryIO):
+        self._zip = zipfile.ZipFile(source)
+        self._names = {info.filename for info in self._zip.infolist() if not info.is_dir()}
+        self._stored: Dict[str, StoredImage] = {}
+        # Files written since the last take_written(), i.e. by the batch being prepared
+        self._written: List[StoredImage] = []
+        # No per-request total: every image is still capped at MAX_IMAGE_BYTES
+        self._budget = ByteBudget(sys.maxsize)
+
+    def store(self, name: str) -> StoredImage:
+        """Blocking: runs in a worker thread"""
+        if name not in self._stored:
+            if name not in self._names:
+                raise ValueError(f"Image {name} is not in the archive")
+            with self._zip.open(name) as source:
+                stored = store_image(source, name, self._budget)
+            self._stored[name] = stored
+            if stored.written:
+                self._written.append(stored)
+        return self._stored[name]
+
+    def take_written(self) -> List[StoredImage]:
+        """Images whose files were written since the last call"""
+        written, self._written = self._written, []
+        return written
+
+    def restore(self, image: StoredImage):
+        """restore callable for acquire_images. Blocking: runs in a worker thread"""
+        name = next(name for name, stored in self._stored.items() if stored.path == image.path)
+        with self._zip.open(name) as source:
+            rewrite_image(source, image)
+
+    async def discard(self, written: List[StoredImage]):
+        """
+        Forget images a failed batch wrote, from take_written(), and delete their
+        files unless a stored_files row references them
+        """
+        paths = {image.path for image in written}
+        for name, image in list(self._stored.items()):
+            if image.path in paths:
+                del self._stored[name]
+        await discard_images(written)
+
+def prepare_batch(
+    rows: Iterator[ManifestRow],
+    archive: Optional[ImageArchive],
+    batch_size: int,
+) -> Tuple[List[Tuple[int, ProductCreate, List[StoredImage]]], List[Dict[str, Any]], bool]:
+    """
+    Validate the next batch_size rows and store their images. Blocking: runs in a worker thread.
+    Returns (valid rows, row errors, whether the manifest is exhausted).
+    """
+    valid = []
+    errors = []
+    for _ in range(batch_size):
+        try:
+            row_number, values, error = next(rows)
+        except StopIteration:
+            return valid, errors, True
+        except (UnicodeDecodeError, csv.Error) as e:
+            # The rest of the manifest can't be read reliably
+            errors.append({"row": None, "error": f"Unreadable manifest: {str(e)}"})
+            return valid, errors, True
+        if error:
+            errors.append({"row": row_number, "error": error})
+            continue
+
+        try:
+            product = ProductCreate.model_validate(values)
+        except ValidationError as e:
+            messages = [f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in e.errors()]
+            errors.append({"row": row_number, "error": "; ".join(messages)})
+            continue
+        if not product.images:
+            errors.append({"row": row_number, "error": "At least one image is required"})
+            continue
+        try:
+            product_location(product.latitude, product.longitude)
+        except ValueError as e:
+            errors.append({"row": row_number, "error": str(e)})
+            continue
+        if archive is None:
+            errors.append({"row": row_number, "error": "No image archive was uploaded"})
+            continue
+
+        try:
+            images = [archive.store(name) for name in product.images]
+        except HTTPException as e:
+            errors.append({"row": row_number, "error": e.detail})
+            continue
+        except (ValueError, zipfile.BadZipFile, OSError) as e:
+            errors.append({"row": row_number, "error": str(e)})
+            continue
+        valid.append((row_number, product, images))
+    return valid, errors, False
+
+async def insert_batch(
+    db: AsyncSession,
+    batch: List[Tuple[int, ProductCreate, List[StoredImage]]],
+    user_id: int,
+    restore: Callable[[StoredImage], None],
+) -> List[int]:
+    """Insert one batch of products and their images with executemany statements; the caller commits"""
+    result = await db.execute(
+        insert(Product).returning(Product.id, sort_by_parameter_order=True),
+        [
+            {
+                "title": product.title,
+                "description": product.description,
+                "city": product.city,
+                "location": product.location,
+                "return_policy": product.return_policy,
+                "size": product.size,
+                "type": product.type,
+                "price": product.price,
+                "category": product.category,
+                "user_id": user_id,
+                **product_location(product.latitude, product.longitude),
+            }
+            for _, product, _ in batch
+        ],
+    )
+    product_ids = result.scalars().all()
+
+    await db.execute(insert(ProductImage), [
+        {
+            "product_id": product_id,
+            "position": position,
+            "path": image.path,
+            "url": public_url(image.path),
+            "width": image.width,
+            "height": image.height,
+        }
+        for product_id, (_, _, images) in zip(product_ids, batch)
+        for position, image in enumerate(images)
+    ])
+    await acquire_images(db, [image for _, _, images in batch for image in images], restore)
+    return product_ids
+
+async def import_products(
+    db: AsyncSession,
+    rows: Iterator[ManifestRow],
+    archive: Optional[ImageArchive],
+    user_id: int,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    variants: bool = True,
+) -> Dict[str, Any]:
+    """
+    Import every manifest row for one seller, committing batch by batch.
+    With variants=False, resized copies are left to `python thumbnails.py`.
+    Returns {"imported", "failed", "errors": [{"row", "error"}]}.
+    """
+    report = {"imported": 0, "failed": 0, "errors": []}
+    done = False
+    while not done:
+        batch, errors, done = await run_in_threadpool(prepare_batch, rows, archive, batch_size)
+        report["errors"].extend(errors)
+
+        # Earlier batches' files may be reused here; only the ones this batch wrote are its own
+        written = archive.take_written() if archive else []
+        used = {image.path for _, _, images in batch for image in images}
+        unused = [image for image in written if image.path not in used]
+        if unused:
+            # Stored for rows that failed afterwards (e.g. on their next image): nothing references them
+            await archive.discard(unused)
+            written = [image for image in written if image.path in used]
+        if not batch:
+            continue
+
+        try:
+            await insert_batch(db, batch, user_id, archive.restore)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error importing rows {batch[0][0]}-{batch[-1][0]}: {str(e)}")
+            report["errors"].extend({"row": row_number, "error": "Database error"} for row_number, _, _ in batch)
+            await archive.discard(written)
+            continue
+
+        report["imported"] += len(batch)
+        await response_cache.invalidate("products", f"ads:{user_id}")
+        if variants:
+            thumbnail_queue.submit([image.path for image in written])
+        logger.info(f"Imported {report['imported']} products for user {user_id}")
+
+    report["failed"] = len(report["errors"])
+    report["errors"].sort(key=lambda error: error["row"] or 0)
+    return report
+
+async def _main(args):
+    from db import async_session
+    from models import User
+
+    format = manifest_format(args.manifest, args.format)
+    with open(args.manifest, "rb") as manifest:
+        archive_file = open(args.images, "rb") if args.images else None
+        try:
+            archive = ImageArchive(archive_file) if archive_file else None
+            async with async_session() as db:
+                if await db.get(User, args.user_id) is None:
+                    raise SystemExit(f"User {args.user_id} not found")
+                report = await import_products(
+                    db, read_manifest(manifest, format), archive, args.user_id, args.batch_size, not args.no_variants
+                )
+        finally:
+            if archive_file:
+                archive_file.close()
+    thumbnail_queue.shutdown(wait=True)
+    return report
+
+if __name__ == "__main__":
+    import asyncio
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import products from a CSV/NDJSON manifest and an image zip")
+    parser.add_argument("manifest")
+    parser.add_argument("--images", help="zip archive of the images referenced by the manifest")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--no-variants", action="store_true", help="skip resized copies; backfill later with thumbnails.py")
+    report = asyncio.run(_main(parser.parse_args()))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] else 0)
@@ -0,0 +1,195 @@
+import os
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from cachetools import TTLCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "memory://" (default), "redis://host:6379/0" or "none" to disable caching
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that counts entries dropped for space and for age"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+class MemoryBackend:
+    """
+    Per-process LRU cache with a TTL. Generations live outside the LRU so they are never evicted.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: int = CACHE_TTL):
+        self._entries = _CountingTTLCache(maxsize=max_entries, ttl=ttl)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._entries.get(key)
+
+    async def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+
+    async def generations(self, namespaces: Sequence[str]) -> List[int]:
+        with self._lock:
+            return [self._generations.get(namespace, 0) for namespace in namespaces]
+
+    async def bump(self, namespaces: Iterable[str]):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "evictions": self._entries.evictions,
+            "expirations": self._entries.expirations,
+        }
+
+class RedisBackend:
+    """
+    Cache shared by every worker process. Requires the `redis` package.
+    Redis evicts by its own maxmemory policy, so evictions are not counted here.
+    """
+
+    def __init__(self, url: str, ttl: int = CACHE_TTL, prefix: str = "bazaar:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at redis but the redis package is not installed")
+        self._client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any):
+        await self._client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    async def generations(self, namespaces: Sequence[str]) -> List[int]:
+        values = await self._client.mget([f"{self.prefix}gen:{namespace}" for namespace in namespaces])
+        return [int(value) if value is not None else 0 for value in values]
+
+    async def bump(self, namespaces: Iterable[str]):
+        async with self._client.pipeline(transaction=False) as pipe:
+            for namespace in namespaces:
+                pipe.incr(f"{self.prefix}gen:{namespace}")
+            await pipe.execute()
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+class ResponseCache:
+    """
+    Read-through cache for JSON-serializable responses.
+
+    Every key embeds the current generation of the namespaces it depends on
+    (e.g. "products", "product:12", "ads:3"). Writers bump those generations
+    after committing, so later reads miss and stale entries simply age out.
+    A read that started before the write stores its result under the old
+    generation, where nobody will look for it again.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def key(self, namespaces: Sequence[str], *parts) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            generations = await self.backend.generations(namespaces)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache unavailable: {str(e)}")
+            return None
+        versions = ",".join(f"{namespace}@{generation}" for namespace, generation in zip(namespaces, generations))
+        return f"{versions}|{json.dumps(parts, separators=(',', ':'), default=str)}"
+
+    async def get(self, key: Optional[str]) -> Optional[Any]:
+        if key is None:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache read failed: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: Optional[str], value: Any):
+        """Store a JSON-ready value (see serializers.py)"""
+        if key is None:
+            return
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache write failed: {str(e)}")
+
+    async def invalidate(self, *namespaces: str):
+        """Call after committing a write that changes the namespaces' data"""
+        if not self.enabled:
+            return
+        try:
+            await self.backend.bump(namespaces)
+        except Exception as e:
+            # Readers may see stale data until the entries expire
+            self.errors += 1
+            logger.error(f"Cache invalidation failed for {namespaces}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__ if self.enabled else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            **(self.backend.stats() if self.enabled else {}),
+        }
+
+def create_backend(url: str):
+    if not url or url == "none":
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+response_cache = ResponseCache(create_backend(CACHE_URL))
+
+# Namespaces invalidated by product writes
+def product_namespaces(product_id: int, user_id: int) -> List[str]:
+    return ["products", f"product:{product_id}", f"ads:{user_id}"]
@@ -1,10 +1,15 @@
 import os
 import logging
+import threading
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import inspect
+from pool_stats import async_pool_stats, instrument, sync_pool_stats, timed_pool_class
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,59 +18,131 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
-# Retrieve the database URL from environment variables
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+# Async drivers used for each supported backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
 
-# Create the engine for SQLAlchemy to connect to the database
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def to_async_url(url: str) -> str:
+    """
+    Convert a sync database URL (e.g. postgresql://...) into its async driver equivalent
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
 
-# Create a sessionmaker instance
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def database_url() -> str:
+    """Sync database URL, from DATABASE_URL"""
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise RuntimeError("DATABASE_URL is not set")
+    return url
+
+def async_database_url() -> str:
+    """Async database URL: ASYNC_DATABASE_URL, or the one derived from DATABASE_URL"""
+    return os.getenv("ASYNC_DATABASE_URL") or to_async_url(database_url())
+
+# Connection pool settings, per engine and per worker process: a deployment can
+# open up to workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds to wait for a free connection before failing the request
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Replace connections older than this many seconds (-1 disables), ahead of server/proxy idle timeouts
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Test each connection on checkout so a restarted database doesn't fail the first requests
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    create_engine arguments for url: the dialect's default pool class, timed,
+    with the pool settings it supports (SQLite often uses non-queue pools)
+    """
+    parsed = make_url(url)
+    pool_class = parsed.get_dialect().get_pool_class(parsed)
+    options = {
+        "poolclass": timed_pool_class(pool_class),
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if issubclass(pool_class, QueuePool):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+# Engines are created on first use, so importing this module (and the app)
+# does no I/O and doesn't need a reachable database
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_lock = threading.Lock()
+
+def get_engine() -> Engine:
+    """Sync engine, used by migrations and command-line tools"""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                url = database_url()
+                _engine = create_engine(url, **engine_options(url))
+                instrument(_engine, sync_pool_stats)
+    return _engine
+
+def get_async_engine() -> AsyncEngine:
+    """Async engine used by the API routes so queries don't block the event loop"""
+    global _async_engine
+    if _async_engine is None:
+        with _lock:
+            if _async_engine is None:
+                url = async_database_url()
+                _async_engine = create_async_engine(url, **engine_options(url))
+                instrument(_async_engine.sync_engine, async_pool_stats)
+    return _async_engine
+
+# Session factories; bound to their engine when a session is opened
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# expire_on_commit=False so ORM objects can still be read after commit without lazy IO
+AsyncSessionLocal = async_sessionmaker(
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+def session() -> Session:
+    return SessionLocal(bind=get_engine())
+
+def async_session() -> AsyncSession:
+    return AsyncSessionLocal(bind=get_async_engine())
 
 # Base class for models
 Base = declarative_base()
 
 # Dependency to get the database session
 def get_db():
-    db = SessionLocal()
+    db = session()
     try:
         yield db
     finally:
         db.close()
 
-# Test connection when this module is imported
-def test_connection():
-    try:
-        # Create inspector first
-        inspector = inspect(engine)
-        
-        # Import here to avoid circular imports
-        from models import User
-        
-        # Create a session
-        db = SessionLocal()
-        
-        # Try to get a user
-        user = db.query(User).first()
-        
-        if user:
-            logger.info(f"✅ Database connection successful! Found user: {user.username}, email: {user.email}")
-        else:
-            # Check if the users table exists
-            if 'user' in inspector.get_table_names():
-                logger.info("✅ Database connected successfully but no users found in the table.")
-            else:
-                logger.info("✅ Database connected but users table doesn't exist yet.")
-        
-        # Show all available tables
-        tables = inspector.get_table_names()
-        logger.info(f"Available tables in database: {tables}")
-        
-        db.close()
-        return True
-    except Exception as e:
-        logger.error(f"❌ Database connection test failed: {str(e)}")
-        return False
+# Dependency to get an async database session
+async def get_async_db():
+    async with async_session() as db:
+        yield db
+
+async def check_connection():
+    """Round trip to the database; raises if it is unreachable"""
+    async with get_async_engine().connect() as connection:
+        await connection.execute(text("SELECT 1"))
 
-# Run the test when this module is imported
-connection_successful = test_connection()
\ No newline at end of file
+async def dispose_engines():
+    """Close pooled connections, e.g. on shutdown"""
+    global _engine, _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
@@ -0,0 +1,39 @@
+"""
+Weak ETags for the JSON endpoints clients poll, derived from row versions.
+
+A product's ETag comes from its version and its owner's; a page's from the
+(id, version) pairs of its rows, which a narrow keyset query returns without
+loading images or serializing anything. Clients sending a matching
+If-None-Match get 304 Not Modified with no body.
+"""
+import hashlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+import orjson
+from fastapi import Response, status
+from uploads import etag_matches
+
+# Bump when the JSON shape of these responses changes, so clients don't keep stale copies
+ETAG_FORMAT = 3
+
+# Clients may store the response but must revalidate it before reuse
+JSON_CACHE_CONTROL = "private, no-cache"
+
+def product_etag(product_id: int, product_version: int, owner_version: int) -> str:
+    return f'W/"p{ETAG_FORMAT}.{product_id}.{product_version}.{owner_version}"'
+
+def page_etag(rows: Iterable[Tuple[int, int]], *parts: Any) -> str:
+    """
+    ETag of a page from the (id, version) of every row fetched for it, including the
+    look-ahead row, and the request parameters that shape the body (sort, limit)
+    """
+    payload = orjson.dumps([ETAG_FORMAT, parts, [[id, version] for id, version in rows]])
+    return f'W/"{hashlib.blake2b(payload, digest_size=12).hexdigest()}"'
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": JSON_CACHE_CONTROL}
+
+def not_modified(if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """304 response if the client's copy is current, otherwise None"""
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+    return None
@@ -0,0 +1,167 @@
+"""
+Product locations and "near me" queries on a geohash index.
+
+Products with a location store latitude, longitude and their geohash (the
+interleaved bits of both, base32-encoded, so nearby points share a prefix).
+A radius search picks the geohash precision whose cells are at least as large
+as the radius, reads the (at most 3x3) cells covering the search box as prefix
+ranges of ix_products_geohash, and keeps the rows within the radius. Pages are
+read from a small circle first, widened until it holds a full page, so a page
+in a dense area doesn't sort every listing within the requested radius.
+
+Rows are ordered by an equirectangular approximation of the distance, computed
+with plain arithmetic so both Postgres and SQLite can sort and page on it
+(SQLite has no portable trigonometry). Within MAX_RADIUS_KM its error is well
+under 1%; responses report the exact great-circle distance. Searches don't wrap
+around the antimeridian or the poles.
+"""
+import math
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import and_, or_, select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Product
+from pagination import keyset
+from prefixes import starts_with
+
+# Characters stored per product: cells of about 5 x 5 m
+GEOHASH_PRECISION = 9
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+# Largest search radius accepted by /products/nearby
+MAX_RADIUS_KM = 100.0
+
+# First circle of a nearest-first search beyond the previous page, and how fast it widens
+START_RADIUS_KM = 2.0
+RADIUS_GROWTH = 4
+
+def geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    value = 0
+    bits = 0
+    # Bits alternate between longitude and latitude, longitude first
+    even = True
+    while len(chars) < precision:
+        coordinate, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            bounds[0] = mid
+        else:
+            value = value * 2
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            value = 0
+            bits = 0
+    return "".join(chars)
+
+def product_location(latitude: Optional[float], longitude: Optional[float]) -> Dict[str, Any]:
+    """Product column values for an optional location; raises ValueError unless both or neither are given"""
+    if latitude is None and longitude is None:
+        return {"latitude": None, "longitude": None, "geohash": None}
+    if latitude is None or longitude is None:
+        raise ValueError("latitude and longitude must be given together")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+    return {"latitude": latitude, "longitude": longitude, "geohash": geohash(latitude, longitude)}
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _cell_size(precision: int):
+    """(height, width) of a geohash cell in degrees"""
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+def _search_box(latitude: float, radius_km: float):
+    """Half height and half width in degrees of the box around a circle"""
+    half_height = radius_km / KM_PER_DEGREE
+    # Longitude degrees are shortest on the box's poleward edge
+    poleward = min(abs(latitude) + half_height, 89.9)
+    return half_height, half_height / math.cos(math.radians(poleward))
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """Geohash prefixes whose cells together cover the circle"""
+    half_height, half_width = _search_box(latitude, radius_km)
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(candidate)
+        if height >= half_height and width >= half_width:
+            precision = candidate
+            break
+    height, width = _cell_size(precision)
+
+    def steps(low: float, high: float, step: float) -> List[float]:
+        # Cells are at least `step` wide, so sampling every step (and the far edge) hits each one
+        points = []
+        while low < high:
+            points.append(low)
+            low += step
+        return points + [high]
+
+    south, north = max(-90.0, latitude - half_height), min(90.0, latitude + half_height)
+    west, east = max(-180.0, longitude - half_width), min(180.0, longitude + half_width)
+    return sorted({
+        geohash(lat, lon, precision)
+        for lat in steps(south, north, height)
+        for lon in steps(west, east, width)
+    })
+
+def distance_key(latitude: float, longitude: float):
+    """SQL expression that grows with the distance from the point: squared equirectangular degrees"""
+    dx = (Product.longitude - longitude) * math.cos(math.radians(latitude))
+    dy = Product.latitude - latitude
+    return dx * dx + dy * dy
+
+def within_radius(dialect: str, latitude: float, longitude: float, radius_km: float):
+    """WHERE condition for products within radius_km, served by ix_products_geohash"""
+    cells = covering_cells(latitude, longitude, radius_km)
+    return and_(
+        # Each cell is a prefix range of ix_products_geohash
+        or_(*[starts_with(dialect, Product.geohash, cell) for cell in cells]),
+        distance_key(latitude, longitude) <= (radius_km / KM_PER_DEGREE) ** 2,
+    )
+
+async def nearest(
+    db: AsyncSession,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    count: int,
+    conditions: Sequence = (),
+    after: Optional[Sequence[Any]] = None,
+) -> List[Row]:
+    """
+    Up to `count` (id, latitude, longitude, distance) rows within radius_km, nearest
+    first, past the (distance, id) key `after`. Every row inside a circle is nearer
+    than any row outside it, so once a circle holds `count` rows they are the answer.
+    """
+    distance = distance_key(latitude, longitude)
+    dialect = db.bind.dialect.name
+    # Start just beyond the previous page
+    search_km = START_RADIUS_KM + (math.sqrt(max(after[0], 0)) * KM_PER_DEGREE if after else 0)
+    while True:
+        search_km = min(search_km, radius_km)
+        query = select(Product.id, Product.latitude, Product.longitude, distance.label("distance")).where(
+            within_radius(dialect, latitude, longitude, search_km), *conditions
+        )
+        rows = (await db.execute(keyset(query, [distance, Product.id], after=after).limit(count))).all()
+        if len(rows) == count or search_km >= radius_km:
+            return rows
+        search_km *= RADIUS_GROWTH
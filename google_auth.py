@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Mapping, Optional
+import requests
+from google.auth import jwt
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GOOGLE_CLIENT_ID = os.getenv(
+    "GOOGLE_CLIENT_ID",
+    "96398954937-fro4o9nvvftfue7a5q3ghhm7bbs1kqi4.apps.googleusercontent.com"
+)
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Used when Google's response has no usable Cache-Control max-age
+DEFAULT_CERTS_TTL = 3600
+# Start a background refresh once the cached certs are this close to expiring
+CERTS_REFRESH_MARGIN = 300
+# Minimum delay between forced refreshes triggered by an unknown key id
+MIN_FORCED_REFRESH_INTERVAL = 30
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+def parse_max_age(cache_control: Optional[str]) -> Optional[int]:
+    """
+    Extract max-age (in seconds) from a Cache-Control header
+    """
+    if not cache_control or "no-store" in cache_control or "no-cache" in cache_control:
+        return None
+    match = _MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else None
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google ID tokens against a TTL-cached copy of Google's signing certs.
+
+    Passing `certs` ({key id: PEM certificate}) pins a local key set and disables
+    all network access, which is what tests and benchmarks use.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        certs: Optional[Mapping[str, str]] = None,
+        certs_url: str = GOOGLE_CERTS_URL,
+        session: Optional[requests.Session] = None,
+        clock_skew_in_seconds: int = 10,
+    ):
+        self.client_id = client_id
+        self.certs_url = certs_url
+        self.clock_skew_in_seconds = clock_skew_in_seconds
+        self.offline = certs is not None
+        self._certs: Dict[str, str] = dict(certs or {})
+        self._expires_at = float("inf") if self.offline else 0.0
+        self._last_fetch = 0.0
+        self._session = session
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _get_session(self) -> requests.Session:
+        # One pooled session for the lifetime of the verifier
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def _fetch_certs(self):
+        """Blocking fetch of the certs; run in a worker thread"""
+        response = self._get_session().get(self.certs_url, timeout=5)
+        response.raise_for_status()
+        ttl = parse_max_age(response.headers.get("Cache-Control"))
+        return response.json(), ttl if ttl is not None else DEFAULT_CERTS_TTL
+
+    async def refresh(self):
+        """Fetch the certs now, keeping the previous set if the fetch fails"""
+        if self.offline:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        requested_at = time.monotonic()
+        async with self._lock:
+            # Callers that queued behind a fetch share its result instead of fetching again
+            if self._last_fetch > requested_at:
+                return
+            try:
+                certs, ttl = await asyncio.to_thread(self._fetch_certs)
+            except Exception as e:
+                logger.error(f"Error fetching Google certs: {str(e)}")
+                if not self._certs:
+                    raise
+                return
+            self._certs = certs
+            self._last_fetch = time.monotonic()
+            self._expires_at = self._last_fetch + ttl
+            logger.info(f"Fetched {len(certs)} Google certs, cached for {ttl}s")
+
+    def _schedule_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    async def get_certs(self) -> Dict[str, str]:
+        now = time.monotonic()
+        if not self._certs or now >= self._expires_at:
+            await self.refresh()
+        elif now >= self._expires_at - CERTS_REFRESH_MARGIN:
+            # Still valid: serve from cache and refresh in the background
+            self._schedule_refresh()
+        return self._certs
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Verify the token signature, audience, expiry and issuer.
+        Raises ValueError for any invalid token.
+        """
+        certs = await self.get_certs()
+        key_id = jwt.decode_header(token).get("kid")
+
+        # Google rotated its keys before our cached copy expired
+        if (
+            key_id not in certs
+            and not self.offline
+            and time.monotonic() - self._last_fetch >= MIN_FORCED_REFRESH_INTERVAL
+        ):
+            await self.refresh()
+            certs = self._certs
+
+        idinfo = jwt.decode(
+            token,
+            certs=certs,
+            audience=self.client_id,
+            clock_skew_in_seconds=self.clock_skew_in_seconds,
+        )
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError("Invalid token issuer")
+        return idinfo
+
+google_verifier = GoogleTokenVerifier(GOOGLE_CLIENT_ID)
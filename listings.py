@@ -0,0 +1,64 @@
+"""
+Listing queries that select only the columns a list response (ProductResponse)
+needs, instead of full Product entities with their joined owner.
+
+Rows become slotted ProductListing objects rather than ORM instances: no identity
+map, change tracking or User hydration per row. Image URLs for a page are read
+with one extra query over product_images.
+"""
+from collections import defaultdict
+from typing import Dict, List, Sequence
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Product, ProductImage
+
+# Everything ProductResponse reads from products, and the version for page ETags;
+# images come from product_images
+LISTING_COLUMNS = (Product.id, Product.title, Product.category, Product.price, Product.type, Product.version)
+
+class ProductListing:
+    """A product as shown in lists"""
+
+    __slots__ = ("id", "title", "category", "price", "type", "version", "image_urls")
+
+    def __init__(
+        self, id: int, title: str, category: str, price: float, type: str, version: int, image_urls: List[str]
+    ):
+        self.id = id
+        self.title = title
+        self.category = category
+        self.price = price
+        self.type = type
+        self.version = version
+        self.image_urls = image_urls
+
+def listing_query(*conditions):
+    """SELECT of the listing columns, to be ordered and paginated by the caller"""
+    return select(*LISTING_COLUMNS).where(*conditions)
+
+async def image_urls(db: AsyncSession, product_ids: Sequence[int]) -> Dict[int, List[str]]:
+    """Image URLs of each product, in position order"""
+    urls = defaultdict(list)
+    if product_ids:
+        result = await db.execute(
+            select(ProductImage.product_id, ProductImage.url)
+            .where(ProductImage.product_id.in_(product_ids))
+            .order_by(ProductImage.product_id, ProductImage.position)
+        )
+        for product_id, url in result:
+            urls[product_id].append(url)
+    return urls
+
+async def load_listings(db: AsyncSession, rows: Sequence) -> List[ProductListing]:
+    """
+    ProductListing objects for rows of a listing query (extra columns such as a
+    search score are ignored), with their image URLs
+    """
+    urls = await image_urls(db, [row.id for row in rows])
+    return [
+        ProductListing(row.id, row.title, row.category, row.price, row.type, row.version, urls.get(row.id, []))
+        for row in rows
+    ]
+
+async def fetch_listings(db: AsyncSession, query) -> List[ProductListing]:
+    return await load_listings(db, (await db.execute(query)).all())
@@ -1,15 +1,34 @@
-from fastapi import FastAPI, Response
-from db import engine
-import models
-from fastapi.staticfiles import StaticFiles
+import os
+import asyncio
+import logging
+from fastapi import FastAPI, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from db import check_connection, dispose_engines, get_async_engine
 from routes import router
+from migrations import pending_migrations
+from passwords import password_hasher
+from thumbnails import thumbnail_queue
+from cache import response_cache
+from pool_stats import async_pool_stats, sync_pool_stats
+from metrics import MetricsMiddleware, install_query_hooks, metrics
+from admission import AdmissionMiddleware, admission
 from fastapi.middleware.cors import CORSMiddleware
 
-# Create database tables (initialization)
-models.Base.metadata.create_all(bind=engine)
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The schema is managed by `python migrations.py`, run once per deploy;
+# importing the app does no database I/O
+
+# Seconds /readyz waits for the database
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Innermost: CORS answers preflights before admission and adds its headers to 503s
+app.add_middleware(AdmissionMiddleware)
 
 # ✅ CORS middleware should be right after creating app
 app.add_middleware(
@@ -18,14 +37,76 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Added last so it is outermost and its latency covers the whole stack
+app.add_middleware(MetricsMiddleware)
+install_query_hooks()
+metrics.register("password_hashing", password_hasher.stats)
+metrics.register("thumbnails", thumbnail_queue.stats)
+metrics.register("cache", response_cache.stats)
+metrics.register("db_pool_async", async_pool_stats.stats)
+metrics.register("db_pool_sync", sync_pool_stats.stats)
+metrics.register("admission", admission.stats)
+
 # ⬇️ Routes and other stuff come after
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Uploaded images are served by the /uploads route in routes.py
 app.include_router(router)
 
 
 
+@app.on_event("shutdown")
+async def shutdown_workers():
+    password_hasher.shutdown()
+    thumbnail_queue.shutdown()
+    await dispose_engines()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Bazaar app!"}
+
+@app.get("/stats")
+def read_stats():
+    """Runtime counters for worker pools, database connection pools, admission pools and the response cache"""
+    return {
+        "password_hashing": password_hasher.stats(),
+        "thumbnails": thumbnail_queue.stats(),
+        "cache": response_cache.stats(),
+        "db_pool": {"async": async_pool_stats.stats(), "sync": sync_pool_stats.stats()},
+        "admission": admission.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Request latency, status and DB-time metrics plus the /stats counters, in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving. Doesn't touch the database."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the database answers and every migration is applied"""
+    async def check():
+        await check_connection()
+        async with get_async_engine().connect() as connection:
+            return await connection.run_sync(pending_migrations)
+
+    try:
+        pending = await asyncio.wait_for(check(), timeout=READY_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {str(e) or type(e).__name__}")
+        return ORJSONResponse(
+            {"status": "unavailable", "database": "unreachable"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if pending:
+        return ORJSONResponse(
+            {"status": "unavailable", "database": "ok", "pending_migrations": pending},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return {"status": "ok", "database": "ok"}
@@ -0,0 +1,208 @@
+"""
+Request and database metrics in Prometheus text format.
+
+MetricsMiddleware (pure ASGI) records per-route latency histograms, in-flight
+gauges and status counts. SQLAlchemy cursor hooks add each statement's count
+and duration to the request that ran it, through a context variable, so the
+per-route DB totals show which endpoints dominate database time. The hot path
+is a few dict updates under one lock per request; rendering happens on scrape.
+"""
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from cachetools import LRUCache
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label for requests that match no route, so scanners can't blow up cardinality
+UNMATCHED_ROUTE = "unmatched"
+
+class RequestDBStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+# Stats of the request being handled, if any
+_request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+class Metrics:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # (method, route, status) -> count
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        # (method, route) -> per-bucket counts (last one is +Inf), then sum and count
+        self.latency: Dict[Tuple[str, str], List[float]] = {}
+        self.in_flight: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.db_queries: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.db_seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+        # name -> function returning a flat dict of numbers, rendered as gauges
+        self.collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def start(self, key: Tuple[str, str]):
+        with self._lock:
+            self.in_flight[key] += 1
+
+    def finish(self, key: Tuple[str, str], status: int, seconds: float, db: RequestDBStats):
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.in_flight[key] -= 1
+            self.requests[key + (status,)] += 1
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            histogram[bucket] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            if db.queries:
+                self.db_queries[key] += db.queries
+                self.db_seconds[key] += db.seconds
+
+    def register(self, name: str, collector: Callable[[], Dict[str, Any]]):
+        """Export the numeric values of collector() as gauges named bazaar_<name>_<key>"""
+        self.collectors[name] = collector
+
+    def render(self) -> str:
+        with self._lock:
+            requests = dict(self.requests)
+            latency = {key: list(values) for key, values in self.latency.items()}
+            in_flight = dict(self.in_flight)
+            db_queries = dict(self.db_queries)
+            db_seconds = dict(self.db_seconds)
+
+        lines = []
+        lines.append("# HELP http_requests_total Requests by route and status code")
+        lines.append("# TYPE http_requests_total counter")
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+        lines.append("# HELP http_request_duration_seconds Request latency by route")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (method, route), values in sorted(latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {values[-1]}")
+
+        lines.append("# HELP http_requests_in_flight Requests being handled by route")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        for (method, route), count in sorted(in_flight.items()):
+            lines.append(f'http_requests_in_flight{{method="{method}",route="{route}"}} {count}')
+
+        lines.append("# HELP db_queries_total SQL statements executed by route")
+        lines.append("# TYPE db_queries_total counter")
+        for (method, route), count in sorted(db_queries.items()):
+            lines.append(f'db_queries_total{{method="{method}",route="{route}"}} {count}')
+
+        lines.append("# HELP db_query_seconds_total Time spent executing SQL by route")
+        lines.append("# TYPE db_query_seconds_total counter")
+        for (method, route), seconds in sorted(db_seconds.items()):
+            lines.append(f'db_query_seconds_total{{method="{method}",route="{route}"}} {seconds:.6f}')
+
+        for name, collector in self.collectors.items():
+            lines.extend(_gauge_lines(f"bazaar_{name}", collector()))
+        return "\n".join(lines) + "\n"
+
+def _gauge_lines(prefix: str, values: Dict[str, Any], labels: str = "") -> List[str]:
+    """Flatten a stats dict; nested dicts become a `key` label"""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, dict):
+            lines.extend(_gauge_lines(prefix, value, f'key="{key}"'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"{prefix}_{key}"
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+metrics = Metrics()
+
+# (method, path) -> route template; bounded because paths contain ids
+_route_cache = LRUCache(maxsize=4096)
+
+def route_template(scope) -> str:
+    """The path template of the route a request will hit, e.g. /products/{product_id}"""
+    key = (scope["method"], scope["path"])
+    template = _route_cache.get(key)
+    if template is None:
+        template = UNMATCHED_ROUTE
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+            if match == Match.PARTIAL and template == UNMATCHED_ROUTE:
+                # Path matches but the method doesn't (405)
+                template = route.path
+        _route_cache[key] = template
+    return template
+
+class MetricsMiddleware:
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.metrics = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        key = (scope["method"], route_template(scope))
+        db = RequestDBStats()
+        token = _request_db_stats.set(db)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.metrics.start(key)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.finish(key, status_code, time.perf_counter() - start, db)
+            _request_db_stats.reset(token)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_db_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _finish_query(conn):
+    starts = conn.info.get("query_start_time")
+    if starts:
+        # Popped even without stats, so the pooled connection's stack can't grow
+        start = starts.pop()
+        stats = _request_db_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += time.perf_counter() - start
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_query(conn)
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    if exception_context.connection is not None:
+        _finish_query(exception_context.connection)
+
+def install_query_hooks():
+    """Time SQL on every engine, including ones created later"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
@@ -0,0 +1,72 @@
+"""
+Move images out of the legacy products.images string into product_images.
+Applied by migrations.py.
+
+Safe to re-run: converted products have their legacy column cleared in the
+same transaction, so only unconverted rows are picked up.
+"""
+import os
+import logging
+from typing import List, Optional, Tuple
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import Engine
+from models import Product, ProductImage
+from uploads import image_size, public_url
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+def parse_legacy_images(images: Optional[str]) -> List[str]:
+    """
+    Split the old PostgreSQL array literal ("{a,b,c}") into file paths
+    """
+    if not images:
+        return []
+    return [path.strip() for path in images.strip("{}").split(",") if path.strip()]
+
+def read_dimensions(path: str) -> Tuple[Optional[int], Optional[int]]:
+    if not os.path.isfile(path):
+        return None, None
+    with open(path, "rb") as f:
+        return image_size(f)
+
+def migrate(engine: Engine, batch_size: int = BATCH_SIZE) -> int:
+    """Convert every product that still has legacy images; returns the number converted"""
+    converted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(Product.id, Product.legacy_images)
+                .where(Product.id > last_id, Product.legacy_images.is_not(None))
+                .order_by(Product.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return converted
+
+            image_rows = []
+            for product_id, legacy_images in rows:
+                for position, path in enumerate(parse_legacy_images(legacy_images)):
+                    width, height = read_dimensions(path)
+                    image_rows.append({
+                        "product_id": product_id,
+                        "position": position,
+                        "path": path,
+                        "url": public_url(path),
+                        "width": width,
+                        "height": height,
+                    })
+            if image_rows:
+                connection.execute(insert(ProductImage), image_rows)
+            product_ids = [product_id for product_id, _ in rows]
+            connection.execute(
+                update(Product).where(Product.id.in_(product_ids)).values(legacy_images=None)
+            )
+
+        converted += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"Converted images of {converted} products")
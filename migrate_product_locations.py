@@ -0,0 +1,33 @@
+"""
+Add the location columns (products.latitude, longitude and geohash) and their
+index, ix_products_geohash, to databases created before they existed. Applied by
+migrations.py.
+
+Existing products have no location and are left out of "near me" searches
+until they are updated with one.
+"""
+import logging
+from sqlalchemy import inspect, text
+from models import Product
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "ix_products_geohash"
+
+COLUMNS = [
+    ("latitude", "FLOAT"),
+    ("longitude", "FLOAT"),
+    ("geohash", "VARCHAR"),
+]
+
+def migrate(connection):
+    existing = {column["name"] for column in inspect(connection).get_columns("products")}
+    for column, ddl in COLUMNS:
+        if column not in existing:
+            connection.execute(text(f"ALTER TABLE products ADD COLUMN {column} {ddl}"))
+            logger.info(f"Added products.{column}")
+
+    index = next(index for index in Product.__table__.indexes if index.name == INDEX_NAME)
+    index.create(bind=connection, checkfirst=True)
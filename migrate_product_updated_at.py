@@ -0,0 +1,22 @@
+"""
+Add products.updated_at to databases created before it existed.
+Applied by migrations.py.
+
+Existing rows get the migration time as their watermark, so the first
+incremental export after upgrading includes them all.
+"""
+import logging
+from sqlalchemy import inspect, text, update
+from models import Product, utcnow
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate(connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("products")}
+    if "updated_at" in columns:
+        return
+    connection.execute(text("ALTER TABLE products ADD COLUMN updated_at TIMESTAMP"))
+    connection.execute(update(Product.__table__).values(updated_at=utcnow()))
+    logger.info("Added products.updated_at")
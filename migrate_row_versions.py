@@ -0,0 +1,30 @@
+"""
+Add the row version columns (products.version, users.version and users.updated_at)
+to databases created before they existed. Applied by migrations.py.
+
+Existing rows start at version 1, like new ones.
+"""
+import logging
+from sqlalchemy import inspect, text, update
+from sqlalchemy.sql import column as sql_column, table as sql_table
+from models import utcnow
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLUMNS = [
+    ("products", "version", "INTEGER NOT NULL DEFAULT 1", None),
+    ("users", "version", "INTEGER NOT NULL DEFAULT 1", None),
+    ("users", "updated_at", "TIMESTAMP", utcnow()),
+]
+
+def migrate(connection):
+    for table, column, ddl, backfill in COLUMNS:
+        existing = {c["name"] for c in inspect(connection).get_columns(table)}
+        if column in existing:
+            continue
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        if backfill is not None:
+            connection.execute(update(sql_table(table, sql_column(column))).values({column: backfill}))
+        logger.info(f"Added {table}.{column}")
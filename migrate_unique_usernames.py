@@ -0,0 +1,38 @@
+"""
+Make usernames unique and index them (ix_users_username). Applied by migrations.py.
+
+Usernames were only checked by the application before, so concurrent signups may
+have left duplicates: the oldest account keeps the name and later ones get the
+next free base_N, like new accounts do (users log in by email, not username).
+"""
+import logging
+from sqlalchemy import text
+from models import User
+from usernames import next_username, taken_usernames_query
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "ix_users_username"
+
+def migrate(connection):
+    duplicates = connection.execute(
+        text("SELECT username FROM users GROUP BY username HAVING count(*) > 1")
+    ).scalars().all()
+    for username in duplicates:
+        ids = connection.execute(
+            text("SELECT id FROM users WHERE username = :username ORDER BY id"), {"username": username}
+        ).scalars().all()
+        for user_id in ids[1:]:
+            taken = connection.execute(taken_usernames_query(connection.dialect.name, username)).scalars()
+            renamed = next_username(username, taken)
+            # Bump the version: product ETags include the owner's
+            connection.execute(
+                text("UPDATE users SET username = :renamed, version = version + 1 WHERE id = :id"),
+                {"renamed": renamed, "id": user_id},
+            )
+            logger.warning(f"Renamed user {user_id} from duplicate username {username} to {renamed}")
+
+    index = next(index for index in User.__table__.indexes if index.name == INDEX_NAME)
+    index.create(bind=connection, checkfirst=True)
@@ -0,0 +1,124 @@
+"""
+Schema migrations, run once per deploy before the app starts:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied and pending migrations
+
+Applied migrations are recorded in the schema_migrations table. Each one is
+also safe to re-run against a database that already has its change, which is
+what lets 0001 bootstrap both new and pre-migration databases. Add schema
+changes as new entries at the end of MIGRATIONS; never edit applied ones.
+"""
+import sys
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, insert, select
+from sqlalchemy.engine import Connection, Engine
+import models
+import migrate_product_images
+import migrate_product_updated_at
+import migrate_row_versions
+import migrate_unique_usernames
+import migrate_product_locations
+from search import ensure_search_index
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("name", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def create_tables(engine: Engine):
+    # Creates missing tables at their current definition
+    models.Base.metadata.create_all(bind=engine)
+
+def add_products_updated_at(engine: Engine):
+    with engine.begin() as connection:
+        migrate_product_updated_at.migrate(connection)
+
+LATER_INDEXES = {migrate_unique_usernames.INDEX_NAME, migrate_product_locations.INDEX_NAME}
+
+def create_indexes(engine: Engine):
+    # create_all skips indexes on tables that already exist
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            # Indexes added later are created by their own migration, after it has
+            # added their columns or made existing rows satisfy them
+            if index.name in LATER_INDEXES:
+                continue
+            index.create(bind=engine, checkfirst=True)
+
+def create_search_index(engine: Engine):
+    # Full-text search index (Postgres GIN / SQLite FTS5)
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+
+def move_product_images(engine: Engine):
+    migrate_product_images.migrate(engine)
+
+def add_row_versions(engine: Engine):
+    with engine.begin() as connection:
+        migrate_row_versions.migrate(connection)
+
+def add_username_index(engine: Engine):
+    with engine.begin() as connection:
+        migrate_unique_usernames.migrate(connection)
+
+def add_product_locations(engine: Engine):
+    with engine.begin() as connection:
+        migrate_product_locations.migrate(connection)
+
+MIGRATIONS: List[Tuple[str, Callable[[Engine], None]]] = [
+    ("0001_create_tables", create_tables),
+    ("0002_products_updated_at", add_products_updated_at),
+    ("0003_indexes", create_indexes),
+    ("0004_search_index", create_search_index),
+    ("0005_product_images", move_product_images),
+    ("0006_row_versions", add_row_versions),
+    ("0007_unique_usernames", add_username_index),
+    ("0008_product_locations", add_product_locations),
+]
+
+def applied_migrations(connection: Connection) -> List[str]:
+    if not inspect(connection).has_table(schema_migrations.name):
+        return []
+    return list(connection.execute(select(schema_migrations.c.name)).scalars())
+
+def pending_migrations(connection: Connection) -> List[str]:
+    applied = set(applied_migrations(connection))
+    return [name for name, _ in MIGRATIONS if name not in applied]
+
+def migrate(engine: Engine) -> List[str]:
+    """Apply pending migrations in order; returns their names"""
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        pending = pending_migrations(connection)
+
+    for name, apply in MIGRATIONS:
+        if name not in pending:
+            continue
+        logger.info(f"Applying migration {name}")
+        apply(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(schema_migrations).values(name=name, applied_at=datetime.utcnow()))
+    if not pending:
+        logger.info("Database schema is up to date")
+    return pending
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    engine = get_engine()
+    if "--status" in sys.argv[1:]:
+        with engine.connect() as connection:
+            applied = set(applied_migrations(connection))
+        for name, _ in MIGRATIONS:
+            print(f"{'applied' if name in applied else 'pending'}  {name}")
+    else:
+        migrate(engine)
@@ -1,8 +1,27 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.sql.functions import FunctionElement
 from db import Base
 
+class utcnow(FunctionElement):
+    """
+    Current time as naive UTC. now() on Postgres is converted to the session's
+    TimeZone when stored in a timestamp without time zone column.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
 # User Table Model
 class User(Base):
     __tablename__ = "users"
@@ -14,9 +33,19 @@ class User(Base):
     rating = Column(Float, default=0.0)
     joining_date = Column(DateTime, default=func.now())
     contact_no = Column(String, nullable=False)
+    # Row version, bumped by the ORM on every update; part of product ETags
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     
     products = relationship("Product", back_populates="owner", cascade="all, delete")
 
+    __table_args__ = (
+        # Unique usernames; text_pattern_ops lets Postgres also use it for the
+        # LIKE 'base\_%' prefix scans in usernames.py under any collation
+        Index("ix_users_username", "username", unique=True, postgresql_ops={"username": "text_pattern_ops"}),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
 # Product Table Model
 class Product(Base):
     __tablename__ = "products"
@@ -28,11 +57,71 @@ class Product(Base):
     location = Column(String)
     return_policy = Column(String)
     size = Column(String)  # Changed from ARRAY(String) to String
-    images = Column(String)  # Store multiple image URLs as a comma-separated string
+    # Pre-product_images "{a,b}" string; emptied by migrate_product_images.py
+    legacy_images = Column("images", String)
     type = Column(String)
     price = Column(Float, nullable=False)
     category = Column(String)
     
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)  # Ensure foreign key constraints
+    # Optional location for "near me" searches; geohash is derived from it (see geo.py)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geohash = Column(String)
+    # Watermark for incremental exports (UTC)
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
+    # Row version, bumped by the ORM on every update (including image changes,
+    # which touch updated_at); ETags are derived from it
+    version = Column(Integer, nullable=False, server_default="1")
     
     owner = relationship("User", back_populates="products", lazy="joined")
+    # Loaded for a whole page of products with one extra IN query
+    images = relationship(
+        "ProductImage", order_by="ProductImage.position", lazy="selectin", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        # Keyset pagination orderings
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_user_id_id", "user_id", "id"),
+        Index("ix_products_updated_at_id", "updated_at", "id"),
+        # Catalog filters and facet counts: every facet query is covered by the
+        # index led by one of its filters, so counts are index-only scans
+        Index("ix_products_facets_category", "category", "city", "type", "size", "price"),
+        Index("ix_products_facets_city", "city", "category", "type", "size", "price"),
+        Index("ix_products_facets_type", "type", "category", "city", "size", "price"),
+        Index("ix_products_facets_size", "size", "category", "city", "type", "price"),
+        # Radius searches: geohash prefix ranges, with the coordinates so distances
+        # are computed from the index alone (text_pattern_ops for LIKE on Postgres)
+        Index(
+            "ix_products_geohash", "geohash", "latitude", "longitude", "id",
+            postgresql_ops={"geohash": "text_pattern_ops"},
+        ),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+# Product Image Model
+class ProductImage(Base):
+    __tablename__ = "product_images"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)  # Display order, 0 is the cover image
+    path = Column(String, nullable=False)  # File on disk, e.g. uploads/ab/ab12...ef.jpeg
+    url = Column(String, nullable=False)  # Public URL, e.g. /uploads/ab/ab12...ef.jpeg
+    width = Column(Integer)
+    height = Column(Integer)
+
+    __table_args__ = (
+        UniqueConstraint("product_id", "position", name="uq_product_images_product_id_position"),
+    )
+
+# Content-addressed upload files, shared by every product that uses the same image
+class StoredFile(Base):
+    __tablename__ = "stored_files"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, unique=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    refcount = Column(Integer, nullable=False, default=0)  # Number of product images pointing at it
+    created_at = Column(DateTime, default=func.now())
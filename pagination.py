@@ -0,0 +1,59 @@
+import json
+import base64
+import binascii
+from typing import Any, List, Optional, Sequence
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    """
+    Encode the sort key values of the last row on a page as an opaque cursor
+    """
+    payload = json.dumps([sort, list(values)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor for the same sort order
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    if cursor_sort != sort or not isinstance(values, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match the requested sort order"
+        )
+    return values
+
+def keyset(stmt, columns: Sequence, descending: bool = False, after: Optional[Sequence[Any]] = None):
+    """
+    Order stmt by columns and, when `after` is given, only select rows past it.
+    The columns must end in a unique key (e.g. id) and be covered by an index.
+    """
+    if after is not None:
+        if len(after) != len(columns):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        if len(columns) == 1:
+            stmt = stmt.where(columns[0] < after[0] if descending else columns[0] > after[0])
+        else:
+            key = tuple_(*columns)
+            stmt = stmt.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    return stmt.order_by(*[column.desc() if descending else column for column in columns])
+
+def next_cursor(rows: Sequence, limit: int, sort: str, key) -> Optional[str]:
+    """
+    Build the cursor for the page after `rows`, which must have been fetched with limit + 1.
+    `key` maps a row to its sort key values.
+    """
+    if len(rows) <= limit:
+        return None
+    return encode_cursor(sort, key(rows[limit - 1]))
@@ -0,0 +1,116 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, Type
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A checkout slower than this is logged as pool pressure
+SLOW_CHECKOUT_SECONDS = 1.0
+
+class PoolStats:
+    """
+    Counters for one connection pool: checkout waits, timeouts and connection churn
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Pool = None
+        self._lock = threading.Lock()
+
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        # Churn: DBAPI connections opened, closed and invalidated
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+        if timed_out:
+            logger.error(f"{self.name} pool exhausted: timed out after {seconds:.2f}s waiting for a connection")
+        elif seconds >= SLOW_CHECKOUT_SECONDS:
+            logger.warning(f"{self.name} pool: waited {seconds:.2f}s for a connection")
+
+    def _count(self, attribute: str):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.pool
+        live = {}
+        if isinstance(pool, QueuePool):
+            live = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+            }
+        return {
+            "pool": type(pool).__name__ if pool is not None else None,
+            **live,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "connects": self.connects,
+            "closes": self.closes,
+            "invalidations": self.invalidations,
+        }
+
+class TimedPoolMixin:
+    """
+    Measures how long each checkout takes: queueing for a free connection,
+    opening a new one and the pre-ping. Set `pool_stats` before use.
+    """
+
+    pool_stats: PoolStats = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.pool_stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # Keep the same stats object when the engine recreates the pool (e.g. after dispose)
+        pool = super().recreate()
+        pool.pool_stats = self.pool_stats
+        self.pool_stats.pool = pool
+        return pool
+
+def timed_pool_class(pool_class: Type[Pool]) -> Type[Pool]:
+    return type(f"Timed{pool_class.__name__}", (TimedPoolMixin, pool_class), {})
+
+def instrument(engine: Engine, stats: PoolStats):
+    """Attach stats to a sync engine (or an AsyncEngine's sync_engine) built with a timed pool class"""
+    engine.pool.pool_stats = stats
+    stats.pool = engine.pool
+
+    event.listen(engine, "checkout", lambda *args: stats._count("checkouts"))
+    event.listen(engine, "checkin", lambda *args: stats._count("checkins"))
+    event.listen(engine, "connect", lambda *args: stats._count("connects"))
+    event.listen(engine, "close", lambda *args: stats._count("closes"))
+    event.listen(engine, "close_detached", lambda *args: stats._count("closes"))
+    event.listen(engine, "invalidate", lambda *args: stats._count("invalidations"))
+    event.listen(engine, "soft_invalidate", lambda *args: stats._count("invalidations"))
+
+sync_pool_stats = PoolStats("sync")
+async_pool_stats = PoolStats("async")
@@ -0,0 +1,17 @@
+"""
+Prefix matches that a plain B-tree index on the column can serve.
+
+On Postgres the index needs text_pattern_ops (or the C collation) for LIKE
+'prefix%' to be planned as a range scan under any database collation. SQLite
+compares text bytewise by default, so there the prefix is an explicit range.
+"""
+import re
+from sqlalchemy import and_
+
+def starts_with(dialect: str, column, prefix: str):
+    """Condition for values of column that start with prefix"""
+    if dialect == "postgresql":
+        escaped = re.sub(r"([\\%_])", r"\\\1", prefix)
+        return column.like(f"{escaped}%", escape="\\")
+    # Binary collation: the values form a contiguous range
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
@@ -1,66 +1,138 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, status
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from google.oauth2 import id_token
-from google.auth.transport import requests
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query, Request, Response, status
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import lazyload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 import os
+import stat
+import zipfile
 import logging
+import orjson
 from datetime import date
-from datetime import datetime
-from models import User, Product
+from datetime import datetime, timezone
+from models import User, Product, ProductImage, utcnow
 from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
+from sqlalchemy.orm.exc import StaleDataError
 from schemas import (
-    UserCreate, UserResponse, AdsResponse, AdsAuth, ProductResponse, 
-    ProductDetailResponse, Login, GoogleAuth
+    UserCreate, UserResponse, UserListResponse, AdsResponse, AdsAuth, ProductResponse, ProductListResponse,
+    ProductDetailResponse, ProductSearchResponse, NearbyProductListResponse, Login, GoogleAuth
 )
-from db import get_db
+from db import async_session, get_async_db
+from passwords import password_hasher, UNUSABLE_PASSWORD
+from google_auth import google_verifier
+from usernames import add_user, base_username
+from pagination import decode_cursor, keyset, next_cursor
+from search import facet_counts, product_filters, search_products
+from uploads import (
+    IMMUTABLE_CACHE_CONTROL, DEFAULT_CACHE_CONTROL, VARIANT_SUFFIX_RE, StoredImage, acquire_images,
+    content_etag, discard_images, etag_matches, is_immutable, public_url, purge_images, release_images,
+    remove_files, resolve_upload_path, save_images, stat_etag, upload_restorer
+)
+from thumbnails import thumbnail_queue
+from cache import product_namespaces, response_cache
+from serializers import ads_json, nearby_json, product_export_json, product_json, product_listing_json, user_json
+from listings import LISTING_COLUMNS, fetch_listings, listing_query, load_listings
+from etags import ETAG_FORMAT, etag_headers, not_modified, page_etag, product_etag
+from geo import MAX_RADIUS_KM, haversine_km, nearest, product_location
+from bulk_import import ImageArchive, import_products, manifest_format, read_manifest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-router = APIRouter()
+# orjson for every response; handlers that return ORJSONResponse directly also skip response_model validation
+router = APIRouter(default_response_class=ORJSONResponse)
 
-# Configure uploads
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+def product_images(stored_images: List[StoredImage], start: int = 0) -> List[ProductImage]:
+    """
+    Image rows for newly stored uploads, positioned after the product's existing images
+    """
+    return [
+        ProductImage(
+            position=start + i,
+            path=image.path,
+            url=public_url(image.path),
+            width=image.width,
+            height=image.height
+        )
+        for i, image in enumerate(stored_images)
+    ]
 
-def save_uploaded_file(file: UploadFile) -> str:
+async def discard_uploads(db: AsyncSession, stored_images: List[StoredImage]):
     """
-    Save uploaded file and return the file path
+    After a failed write: roll back, so the request's row locks are released, then
+    delete the files this request wrote that no stored_files row references
     """
-    # Create date-based subdirectory to prevent filename collisions
-    today = datetime.now().strftime("%Y%m%d")
-    upload_subdir = os.path.join(UPLOAD_DIR, today)
-    os.makedirs(upload_subdir, exist_ok=True)
-
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%H%M%S")
-    filename = f"{timestamp}_{file.filename}"
-    file_path = os.path.join(upload_subdir, filename)
-
-    return file_path
-
-# Add direct file serving endpoint that keeps the original path format
-@router.get("/uploads/{date_dir}/{filename}")
-async def serve_image(date_dir: str, filename: str):
-    """Serve image files directly from the uploads directory"""
-    file_path = os.path.join(UPLOAD_DIR, date_dir, filename)
-    if not os.path.exists(file_path):
+    try:
+        await db.rollback()
+        await discard_images(stored_images)
+    except Exception as e:
+        logger.warning(f"Could not clean up images of a failed request: {str(e)}")
+
+# Keyset orderings for product listings: (columns, descending)
+PRODUCT_SORTS = {
+    "id": ((Product.id,), False),
+    "price": ((Product.price, Product.id), False),
+    "newest": ((Product.id,), True),
+}
+
+def sort_key(columns):
+    return lambda row: [getattr(row, column.key) for column in columns]
+
+# Single serving path for uploaded images: content-addressed blobs, variants and older uploads
+@router.get("/uploads/{file_path:path}")
+@router.head("/uploads/{file_path:path}", include_in_schema=False)
+async def serve_image(file_path: str, request: Request):
+    """Serve image files with strong ETags, long-lived caching and byte ranges"""
+    path = resolve_upload_path(file_path)
+    if path is None:
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(file_path)
 
-@router.get("/all_users", response_model=List[UserResponse])
-async def get_users(db: Session = Depends(get_db)):
-    """Get all users"""
+    if_none_match = request.headers.get("if-none-match")
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_immutable(file_path) else DEFAULT_CACHE_CONTROL
+
+    # Content-addressed files can be revalidated without touching the disk
+    etag = content_etag(file_path)
+    if etag and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
     try:
-        users = db.query(User).all()
-        logger.info(f"Retrieved {len(users)} users")
-        return users
+        stat_result = await run_in_threadpool(os.stat, path)
+    except (FileNotFoundError, NotADirectoryError):
+        stat_result = None
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+        # A resized variant that isn't generated yet: serve the original, uncached
+        original = VARIANT_SUFFIX_RE.sub("", path)
+        if original != path and os.path.isfile(original):
+            return FileResponse(original, headers={"Cache-Control": "no-cache"})
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = etag or stat_etag(stat_result)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, stat_result=stat_result, headers=headers)
+
+@router.get("/all_users", response_model=UserListResponse)
+async def get_users(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get users by id. Pass next_cursor of the previous response as `cursor` to get the next page."""
+    try:
+        after = decode_cursor(cursor, "id") if cursor else None
+        query = keyset(select(User), (User.id,), after=after)
+        users = (await db.scalars(query.limit(limit + 1))).all()
+
+        next_page = next_cursor(users, limit, "id", sort_key((User.id,)))
+
+        logger.info(f"Retrieved {len(users[:limit])} users")
+        return ORJSONResponse({"items": [user_json(user) for user in users[:limit]], "next_cursor": next_page})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching users: {str(e)}")
         raise HTTPException(
@@ -69,11 +141,11 @@ async def get_users(db: Session = Depends(get_db)):
         )
 
 @router.post("/users", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new user"""
     try:
         # Check if username exists
-        existing_user = db.query(User).filter(User.username == user.username).first()
+        existing_user = (await db.scalars(select(User).where(User.username == user.username))).first()
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -81,7 +153,7 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
             )
 
         # Check if email exists
-        existing_email = db.query(User).filter(User.email == user.email).first()
+        existing_email = (await db.scalars(select(User).where(User.email == user.email))).first()
         if existing_email:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -95,14 +167,22 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
             contact_no=user.contact_no
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         logger.info(f"Created new user: {user.username}")
-        return db_user
+        return ORJSONResponse(user_json(db_user))
 
     except HTTPException:
         raise
+    except IntegrityError as ie:
+        # A concurrent request registered the same username or email (unique indexes)
+        await db.rollback()
+        logger.error(f"Database integrity error: {str(ie)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already exists"
+        )
     except Exception as e:
         logger.error(f"Error creating user: {str(e)}")
         raise HTTPException(
@@ -122,10 +202,12 @@ async def create_product(
     price: float = Form(...),
     category: str = Form(...),
     user_id: int = Form(...),
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None),
     images: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Create a new product with images"""
+    """Create a new product with images and, optionally, its location"""
     try:
         logger.info("Received product creation request")
         logger.info(f"Title: {title}")
@@ -133,7 +215,7 @@ async def create_product(
         logger.info(f"Number of images: {len(images)}")
 
         # Validate user exists
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -147,34 +229,27 @@ async def create_product(
                 detail="At least one image is required"
             )
 
-        # Process images
-        image_paths = []
-        for image in images:
-            try:
-                if not image.content_type.startswith('image/'):
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"File {image.filename} is not an image"
-                    )
-
-                file_path = save_uploaded_file(image)
-                with open(file_path, "wb") as f:
-                    content = await image.read()
-                    f.write(content)
-                image_paths.append(file_path)
-                logger.info(f"Saved image: {file_path}")
-
-            except HTTPException:
-                raise
-            except Exception as e:
-                logger.error(f"Error saving image {image.filename}: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Error saving image: {str(e)}"
-                )
+        # Validate the location before storing any image
+        try:
+            coordinates = product_location(latitude, longitude)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e)
+            )
 
-        # Convert image_paths to PostgreSQL array format
-        images_pg_array = "{" + ",".join(image_paths) + "}"
+        # Stream images to disk off the event loop
+        try:
+            stored_images = await save_images(images)
+            image_paths = [image.path for image in stored_images]
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error saving images: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error saving image: {str(e)}"
+            )
 
         # Create product
         try:
@@ -189,28 +264,38 @@ async def create_product(
                 price=float(price),
                 category=category,
                 user_id=int(user_id),
-                images=images_pg_array  # Ensure correct array format
+                images=product_images(stored_images),
+                **coordinates
             )
             db.add(db_product)
-            db.commit()
-            db.refresh(db_product)
-            
-            logger.info(f"Created product: {db_product.id}")
-            return db_product
+            await acquire_images(db, stored_images, upload_restorer(images, stored_images))
+            await db.commit()
+            await db.refresh(db_product)
 
         except ValueError as e:
             logger.error(f"Validation error: {str(e)}")
+            await discard_uploads(db, stored_images)
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=f"Invalid data format: {str(e)}"
             )
         except Exception as e:
             logger.error(f"Database error: {str(e)}")
+            await discard_uploads(db, stored_images)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error creating product"
             )
 
+        # The product is committed: nothing below may fail the request
+        await response_cache.invalidate(*product_namespaces(db_product.id, db_product.user_id))
+
+        # Resized variants are generated in the background, best effort
+        thumbnail_queue.submit(image_paths)
+
+        logger.info(f"Created product: {db_product.id}")
+        return ORJSONResponse(product_json(db_product))
+
     except HTTPException:
         raise
     except Exception as e:
@@ -220,56 +305,107 @@ async def create_product(
             detail="Internal server error"
         )
 
-@router.get("/products", response_model=List[ProductResponse])
+@router.post("/products/import")
+async def import_products_bulk(
+    user_id: int = Form(...),
+    manifest: UploadFile = File(...),
+    images: UploadFile = File(None),
+    format: Optional[Literal["csv", "ndjson"]] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Import many products for one user from a CSV/NDJSON manifest and a zip of their images.
+    Valid rows are imported even when others fail; the response lists every failed row.
+    """
+    try:
+        user = await db.get(User, user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+
+        try:
+            manifest_type = manifest_format(manifest.filename, format)
+            archive = ImageArchive(images.file) if images and images.filename else None
+        except (ValueError, zipfile.BadZipFile) as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e) if isinstance(e, ValueError) else "Images must be a zip archive"
+            )
+
+        report = await import_products(db, read_manifest(manifest.file, manifest_type), archive, user_id)
+        logger.info(f"Bulk import for user {user_id}: {report['imported']} imported, {report['failed']} failed")
+        return ORJSONResponse(report)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing products: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error importing products"
+        )
+
+@router.get("/products", response_model=ProductListResponse)
 async def get_products(
-    limit: int = 20,
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
     offset: int = 0,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    sort: Literal["id", "price", "newest"] = "id",
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    type: Optional[str] = None,
+    size: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all products with pagination"""
+    """
+    Get products with optional filters and keyset pagination. Pass next_cursor
+    of the previous response as `cursor` to get the next page.
+    Send the ETag of a page back in If-None-Match to get 304 if it hasn't changed.
+    """
     try:
-        products = db.query(Product).offset(offset).limit(limit).all()
-
-        # Process products to fix the image paths for frontend
-        for product in products:
-            if hasattr(product, 'images') and product.images:
-                # Process PostgreSQL array format
-                if isinstance(product.images, str):
-                    images_str = product.images.strip('{}')
-                    image_paths = [path.strip() for path in images_str.split(',') if path.strip()]
-                else:
-                    image_paths = product.images
-
-                # Make paths appropriate for frontend (convert local paths to API URLs)
-                api_paths = []
-                for path in image_paths:
-                    if path:
-                        # Ensure we have the proper path for the API endpoint
-                        # Extract the date dir and filename parts
-                        parts = path.split('/')
-                        
-                        # Find the date directory and filename
-                        # Looking for pattern like uploads/20250403/filename.jpg
-                        if len(parts) >= 2:
-                            # Check if parts[0] is 'uploads'
-                            if parts[0] == 'uploads':
-                                date_dir = parts[1]  # 20250403
-                                filename = '/'.join(parts[2:])  # everything after date_dir
-                                # Form the correct API URL path
-                                api_paths.append(f"/uploads/{date_dir}/{filename}")
-                            else:
-                                # If 'uploads' is not in the path, use as is
-                                api_paths.append(f"/uploads/{path}")
-                        else:
-                            # Fallback if path format is unexpected
-                            api_paths.append(path)
-
-                # Update the images attribute
-                product.images = api_paths
-                print(products)
-        
-        logger.info(f"Retrieved {len(products)} products")
-        return products
+        if_none_match = request.headers.get("if-none-match")
+        cache_key = await response_cache.key(
+            ["products"], ETAG_FORMAT, limit, offset, cursor, sort, category, city, type, size, min_price, max_price
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return not_modified(if_none_match, cached["etag"]) or ORJSONResponse(
+                cached["result"], headers=etag_headers(cached["etag"])
+            )
+
+        filters = product_filters(category, city, type, size, min_price, max_price)
+        columns, descending = PRODUCT_SORTS[sort]
+        after = decode_cursor(cursor, sort) if cursor else None
+        query = keyset(listing_query(*filters.values()), columns, descending, after)
+        if offset and after is None:
+            # Deprecated: offsets are still honoured for older clients
+            query = query.offset(offset)
+        query = query.limit(limit + 1)
+
+        if if_none_match:
+            # Revalidate from the page's ids and versions alone, before loading anything else
+            versions = (await db.execute(query.with_only_columns(Product.id, Product.version))).all()
+            response = not_modified(if_none_match, page_etag(versions, sort, limit))
+            if response:
+                return response
+
+        products = await fetch_listings(db, query)
+        etag = page_etag([(product.id, product.version) for product in products], sort, limit)
+        next_page = next_cursor(products, limit, sort, sort_key(columns))
+
+        # Make image paths appropriate for frontend
+        result = {"items": [product_listing_json(product) for product in products[:limit]], "next_cursor": next_page}
+
+        logger.info(f"Retrieved {len(result['items'])} products")
+        await response_cache.set(cache_key, {"result": result, "etag": etag})
+        return ORJSONResponse(result, headers=etag_headers(etag))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching products: {str(e)}")
         raise HTTPException(
@@ -277,60 +413,204 @@ async def get_products(
             detail="Error retrieving products"
         )
 
+@router.get("/products/search", response_model=ProductSearchResponse)
+async def search(
+    q: Optional[str] = Query(None, max_length=200),
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    type: Optional[str] = None,
+    size: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    facets: bool = True,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Search and filter products. With `q`, results are full-text matches on title,
+    description and category, best match first; otherwise they are ordered by id.
+    Facet counts for category, city, type and size are returned with the first page.
+    """
+    try:
+        filters = product_filters(category, city, type, size, min_price, max_price)
+        q = q.strip() if q else None
+
+        if q:
+            # Scores only order the results of the query they were computed for
+            sort = f"relevance:{q}"
+            after = decode_cursor(cursor, sort) if cursor else None
+            if after is not None and len(after) != 2:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor"
+                )
+            results = await search_products(db, q, limit + 1, after, filters.values(), LISTING_COLUMNS)
+            products = await load_listings(db, results[:limit])
+            next_page = next_cursor(results, limit, sort, lambda row: [float(row.score), row.id])
+        else:
+            after = decode_cursor(cursor, "id") if cursor else None
+            query = keyset(listing_query(*filters.values()), (Product.id,), after=after)
+            products = await fetch_listings(db, query.limit(limit + 1))
+            next_page = next_cursor(products, limit, "id", sort_key((Product.id,)))
+
+        # Facets describe the whole result set, so they are only needed once
+        facet_results = await facet_counts(db, filters, q) if facets and not cursor else {}
+
+        logger.info(f"Search '{q or ''}' returned {len(products[:limit])} products")
+        return ORJSONResponse({
+            "items": [product_listing_json(product) for product in products[:limit]],
+            "next_cursor": next_page,
+            "facets": facet_results
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching products: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error searching products"
+        )
+
+# Rows fetched per round trip while exporting
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+async def stream_products(updated_since: Optional[datetime]):
+    """
+    Yield the catalog as NDJSON, one batch of rows at a time, from a server-side cursor.
+    Runs after the handler returns, so it uses its own session.
+    """
+    query = (
+        select(Product)
+        # The owner isn't exported; images are loaded per batch
+        .options(lazyload(Product.owner))
+        .order_by(Product.updated_at, Product.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if updated_since is not None:
+        query = query.where(Product.updated_at >= updated_since)
+
+    exported = 0
+    try:
+        async with async_session() as db:
+            result = await db.stream_scalars(query)
+            async for products in result.partitions():
+                yield b"".join(orjson.dumps(product_export_json(product)) + b"\n" for product in products)
+                exported += len(products)
+    except Exception as e:
+        # Headers are already sent: abort the stream so the client sees it incomplete
+        logger.error(f"Error exporting products after {exported} rows: {str(e)}")
+        raise
+    logger.info(f"Exported {exported} products")
+
+@router.get("/products/export")
+async def export_products(updated_since: Optional[datetime] = None):
+    """
+    Stream every product as NDJSON, oldest change first. For incremental pulls pass
+    `updated_since` (UTC): rows changed at or after it are returned, so use the last
+    row's updated_at, minus a small margin for transactions still in flight.
+    Deleted products are not reported.
+    """
+    if updated_since is not None and updated_since.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+    return StreamingResponse(stream_products(updated_since), media_type="application/x-ndjson")
+
+@router.get("/products/nearby", response_model=NearbyProductListResponse)
+async def nearby_products(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=MAX_RADIUS_KM),
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    size: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Products within radius_km of (lat, lon), nearest first; products without a
+    location are not included. Pass next_cursor of the previous response as
+    `cursor` to get the next page.
+    """
+    try:
+        # Cursors are only valid for the point and radius they were issued for
+        sort = f"nearby:{lat}:{lon}:{radius_km}"
+        after = decode_cursor(cursor, sort) if cursor else None
+        if after is not None and (len(after) != 2 or not isinstance(after[0], (int, float))):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        filters = product_filters(category, None, type, size, min_price, max_price)
+
+        # Nearest ids first, from the geohash index; listings only for the page
+        rows = await nearest(db, lat, lon, radius_km, limit + 1, filters.values(), after)
+        page = rows[:limit]
+        listings = {
+            listing.id: listing
+            for listing in await fetch_listings(db, listing_query(Product.id.in_([row.id for row in page])))
+        }
+
+        items = [
+            nearby_json(listings[row.id], haversine_km(lat, lon, row.latitude, row.longitude))
+            for row in page
+            if row.id in listings
+        ]
+        next_page = next_cursor(rows, limit, sort, lambda row: [row.distance, row.id])
+        logger.info(f"Retrieved {len(items)} products within {radius_km} km")
+        return ORJSONResponse({"items": items, "next_cursor": next_page})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching nearby products: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error retrieving nearby products"
+        )
+
 @router.get("/products/{product_id}", response_model=ProductDetailResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
-    """Get detailed product information"""
+async def get_product(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get detailed product information. Send the ETag back in If-None-Match
+    to get 304 if neither the product nor its owner changed.
+    """
     try:
-        product = db.query(Product).filter(Product.id == product_id).first()
+        if_none_match = request.headers.get("if-none-match")
+        cache_key = await response_cache.key([f"product:{product_id}"], ETAG_FORMAT, product_id)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return not_modified(if_none_match, cached["etag"]) or ORJSONResponse(
+                cached["detail"], headers=etag_headers(cached["etag"])
+            )
+
+        if if_none_match:
+            # Revalidate from the two row versions before loading the product
+            versions = (await db.execute(
+                select(Product.version, User.version).join(Product.owner).where(Product.id == product_id)
+            )).first()
+            response = versions and not_modified(if_none_match, product_etag(product_id, *versions))
+            if response:
+                return response
+
+        product = await db.get(Product, product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
 
-        # Get user details
-        user = db.query(User).filter(User.id == product.user_id).first()
+        # The owner is loaded with the product (lazy="joined")
+        user = product.owner
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
 
-        # Process images to make them accessible via API
-        try:
-            if isinstance(product.images, str):
-                # Remove PostgreSQL array format characters and split
-                images_str = product.images.strip('{}')
-                image_paths = [path.strip() for path in images_str.split(',') if path.strip()]
-            else:
-                image_paths = product.images if product.images else []
-            
-            # Convert paths to API-accessible URLs
-            api_paths = []
-            for path in image_paths:
-                if path:
-                    # Similar path parsing as in get_products
-                    parts = path.split('/')
-                    
-                    if len(parts) >= 2:
-                        # Check if parts[0] is 'uploads'
-                        if parts[0] == 'uploads':
-                            date_dir = parts[1]  # 20250403
-                            filename = '/'.join(parts[2:])  # everything after date_dir
-                            # Form the correct API URL path
-                            api_paths.append(f"/uploads/{date_dir}/{filename}")
-                        else:
-                            # If 'uploads' is not in the path, use as is
-                            api_paths.append(f"/uploads/{path}")
-                    else:
-                        # Fallback if path format is unexpected
-                        api_paths.append(path)
-            
-        except Exception as img_error:
-            logger.error(f"Error processing images for product {product_id}: {str(img_error)}")
-            api_paths = []
-
-        return {
+        detail = {
             "id": product.id,
             "title": product.title,
             "description": product.description,
@@ -339,9 +619,11 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
             "type": product.type,
             "city": product.city,
             "location": product.location,
+            "latitude": product.latitude,
+            "longitude": product.longitude,
             "return_policy": product.return_policy,
             "size": product.size,
-            "images": api_paths,  # API-accessible image paths
+            "images": [image.url for image in product.images],
             "user": {
                 "id": user.id,
                 "username": user.username,
@@ -354,6 +636,9 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
                 )
             }
         }
+        etag = product_etag(product.id, product.version, user.version)
+        await response_cache.set(cache_key, {"detail": detail, "etag": etag})
+        return ORJSONResponse(detail, headers=etag_headers(etag))
 
     except HTTPException:
         raise
@@ -365,7 +650,7 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
         )    
 
 @router.post("/signup", response_model=UserResponse)
-async def signup(signup: UserCreate, db: Session = Depends(get_db)):
+async def signup(signup: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """User sign-up with improved error handling"""
     try:
         # Input validation
@@ -376,14 +661,14 @@ async def signup(signup: UserCreate, db: Session = Depends(get_db)):
             )
 
         # Check if email already exists
-        if db.query(User).filter(User.email == signup.email).first():
+        if (await db.scalars(select(User).where(User.email == signup.email))).first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
 
         # Check if username already exists
-        if db.query(User).filter(User.username == signup.username).first():
+        if (await db.scalars(select(User).where(User.username == signup.username))).first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already taken"
@@ -393,23 +678,23 @@ async def signup(signup: UserCreate, db: Session = Depends(get_db)):
         new_user = User(
             username=signup.username,
             email=signup.email,
-            password=pwd_context.hash(signup.password),
+            password=await password_hasher.hash(signup.password),
             joining_date=date.today(),
             contact_no=str(signup.contact_no) if signup.contact_no else ""
         )
 
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
 
         logger.info(f"User signed up successfully: {signup.username}")
-        return new_user
+        return ORJSONResponse(user_json(new_user))
 
     except HTTPException as he:
         logger.error(f"HTTP error during signup: {str(he)}")
         raise he
     except IntegrityError as ie:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database integrity error: {str(ie)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -423,7 +708,7 @@ async def signup(signup: UserCreate, db: Session = Depends(get_db)):
         )
 
 @router.post("/login")
-async def login(login: Login, db: Session = Depends(get_db)):
+async def login(login: Login, db: AsyncSession = Depends(get_async_db)):
     """User login with password hashing check"""
     try:
         # Input validation
@@ -434,7 +719,7 @@ async def login(login: Login, db: Session = Depends(get_db)):
             )
 
         # Get user by email
-        user = db.query(User).filter(User.email == login.email).first()
+        user = (await db.scalars(select(User).where(User.email == login.email))).first()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -442,7 +727,7 @@ async def login(login: Login, db: Session = Depends(get_db)):
             )
 
         # Verify password
-        if not pwd_context.verify(login.password, user.password):
+        if not await password_hasher.verify(login.password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -461,58 +746,35 @@ async def login(login: Login, db: Session = Depends(get_db)):
             detail="Internal server error"
         )
 @router.post("/google-login")
-async def google_login(auth: GoogleAuth, db: Session = Depends(get_db)):
+async def google_login(auth: GoogleAuth, db: AsyncSession = Depends(get_async_db)):
     """User login with Google OAuth - with automatic signup if user doesn't exist"""
     try:
-        # Verify the Google token
-        CLIENT_ID = "96398954937-fro4o9nvvftfue7a5q3ghhm7bbs1kqi4.apps.googleusercontent.com"
-        idinfo = id_token.verify_oauth2_token(auth.id_token, requests.Request(), CLIENT_ID)
-        
-        # Check if token is valid
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token issuer"
-            )
+        # Verify the Google token (signature, audience, expiry and issuer)
+        idinfo = await google_verifier.verify(auth.id_token)
         
         # Extract user information from token
         email = idinfo['email']
         
         # Check if user exists
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.scalars(select(User).where(User.email == email))).first()
         
         # If user doesn't exist, create one automatically
         if not user:
             logger.info(f"User not found with Google email: {email}. Creating new account.")
             
-            # Extract name from Google token
-            name = idinfo.get('name', '')
-            
-            # Generate username from email if name is not available
-            username = name.replace(" ", "_").lower() if name else email.split('@')[0]
-            base_username = username
-            
-            # Make sure username is unique
-            counter = 1
-            while db.query(User).filter(User.username == username).first():
-                username = f"{base_username}_{counter}"
-                counter += 1
-            
-            # Create a random secure password for Google auth users
-            google_password = pwd_context.hash(os.urandom(24).hex())
+            # Username from the Google name, or the email if there is none; base_N if taken
+            username = base_username(idinfo.get('name', ''), email)
             
-            # Create new user
-            new_user = User(
-                username=username,
+            # Google users have no password; they authenticate via Google
+            new_user = await add_user(
+                db,
+                username,
                 email=email,
-                password=google_password,  # Hashed random password
+                password=UNUSABLE_PASSWORD,
                 joining_date=date.today(),
                 contact_no=""
             )
-            
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
+            await db.refresh(new_user)
             
             logger.info(f"User automatically signed up with Google: {email}")
             user = new_user
@@ -537,7 +799,8 @@ async def google_login(auth: GoogleAuth, db: Session = Depends(get_db)):
         )
         
 @router.post("/ads", response_model=AdsResponse)
-async def adsresponse(auth: AdsAuth, db: Session = Depends(get_db)):
+async def adsresponse(auth: AdsAuth, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # A read despite the POST (the id travels in the body), so it honours If-None-Match like GET
     try:
         if not auth.id:
             raise HTTPException(
@@ -545,62 +808,40 @@ async def adsresponse(auth: AdsAuth, db: Session = Depends(get_db)):
                 detail="Id is missing"
             )
         
-        ads = db.query(Product).filter(Product.user_id == auth.id).all()
+        if_none_match = request.headers.get("if-none-match")
+        cache_key = await response_cache.key(
+            [f"ads:{auth.id}"], ETAG_FORMAT, auth.id, auth.limit, auth.cursor, auth.sort
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return not_modified(if_none_match, cached["etag"]) or ORJSONResponse(
+                cached["result"], headers=etag_headers(cached["etag"])
+            )
+
+        columns, descending = PRODUCT_SORTS[auth.sort]
+        after = decode_cursor(auth.cursor, auth.sort) if auth.cursor else None
+        query = keyset(listing_query(Product.user_id == auth.id), columns, descending, after).limit(auth.limit + 1)
+
+        if if_none_match:
+            versions = (await db.execute(query.with_only_columns(Product.id, Product.version))).all()
+            response = not_modified(if_none_match, page_etag(versions, auth.sort, auth.limit))
+            if response:
+                return response
+
+        ads = await fetch_listings(db, query)
+        etag = page_etag([(ad.id, ad.version) for ad in ads], auth.sort, auth.limit)
         if not ads:
             # Return empty response with a message
-            return AdsResponse(
-                message="No ads found",
-                adslist=[]
+            result = ads_json("No ads found", [])
+        else:
+            result = ads_json(
+                "Ads retrieved successfully",
+                ads[:auth.limit],
+                next_cursor(ads, auth.limit, auth.sort, sort_key(columns))
             )
-        
-        ads_list = []
-        for ad in ads:
-            # Process images to convert them to API URLs
-            api_paths = []
-            if hasattr(ad, 'images') and ad.images:
-                # Process PostgreSQL array format
-                if isinstance(ad.images, str):
-                    images_str = ad.images.strip('{}')
-                    image_paths = [path.strip() for path in images_str.split(',') if path.strip()]
-                else:
-                    image_paths = ad.images if ad.images else []
-
-                # Convert paths to API-accessible URLs
-                for path in image_paths:
-                    if path:
-                        # Extract the date dir and filename parts
-                        parts = path.split('/')
-                        
-                        # Looking for pattern like uploads/20250403/filename.jpg
-                        if len(parts) >= 2:
-                            # Check if parts[0] is 'uploads'
-                            if parts[0] == 'uploads':
-                                date_dir = parts[1]  # 20250403
-                                filename = '/'.join(parts[2:])  # everything after date_dir
-                                # Form the correct API URL path
-                                api_paths.append(f"/uploads/{date_dir}/{filename}")
-                            else:
-                                # If 'uploads' is not in the path, use as is
-                                api_paths.append(f"/uploads/{path}")
-                        else:
-                            # Fallback if path format is unexpected
-                            api_paths.append(path)
-
-            ads_list.append(
-                ProductResponse(
-                    id=ad.id,
-                    title=ad.title,
-                    images=api_paths,  # Use processed API URLs
-                    category=ad.category,
-                    price=ad.price,
-                    type=ad.type
-                )
-            )
-        
-        return AdsResponse(
-            message="Ads retrieved successfully",
-            adslist=ads_list
-        )
+
+        await response_cache.set(cache_key, {"result": result, "etag": etag})
+        return ORJSONResponse(result, headers=etag_headers(etag))
         
     except HTTPException as he:
         logger.error(f"HTTP error during ads retrieval: {str(he)}")
@@ -615,42 +856,33 @@ async def adsresponse(auth: AdsAuth, db: Session = Depends(get_db)):
 @router.delete("/products/{product_id}", status_code=status.HTTP_200_OK)
 async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a product by ID"""
     try:
-        # Find the product
-        product = db.query(Product).filter(Product.id == product_id).first()
+        # Find the product; its owner isn't needed here
+        product = await db.get(Product, product_id, options=[lazyload(Product.owner)])
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
         
-        # Delete image files if they exist
-        if hasattr(product, 'images') and product.images:
-            try:
-                # Process PostgreSQL array format
-                if isinstance(product.images, str):
-                    images_str = product.images.strip('{}')
-                    image_paths = [path.strip() for path in images_str.split(',') if path.strip()]
-                else:
-                    image_paths = product.images if product.images else []
-                
-                # Attempt to delete each image file
-                for path in image_paths:
-                    if path and os.path.exists(path):
-                        try:
-                            os.remove(path)
-                            logger.info(f"Deleted image file: {path}")
-                        except Exception as file_error:
-                            logger.warning(f"Could not delete image file {path}: {str(file_error)}")
-            except Exception as img_error:
-                logger.error(f"Error processing images for deletion: {str(img_error)}")
-        
+        # Release the product's references to its image files
+        image_paths = [image.path for image in product.images]
+        untracked = await release_images(db, image_paths)
+
         # Delete the product from database
-        db.delete(product)
-        db.commit()
+        await db.delete(product)
+        await db.commit()
+        await response_cache.invalidate(*product_namespaces(product_id, product.user_id))
+
+        # Only unlink files that no other product uses
+        try:
+            await purge_images(db, image_paths)
+            await run_in_threadpool(remove_files, [path for path in untracked if path])
+        except Exception as file_error:
+            logger.warning(f"Could not delete image files of product {product_id}: {str(file_error)}")
         
         logger.info(f"Product {product_id} deleted successfully")
         return {"message": "Product deleted successfully"}
@@ -677,13 +909,16 @@ async def update_product(
     type: str = Form(None),
     price: float = Form(None),
     category: str = Form(None),
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None),
     images: List[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Update a product by ID"""
+    """Update a product by ID. A new location needs both latitude and longitude."""
+    new_images: List[StoredImage] = []
     try:
-        # Find the product
-        product = db.query(Product).filter(Product.id == product_id).first()
+        # Find the product; its owner isn't needed here
+        product = await db.get(Product, product_id, options=[lazyload(Product.owner)])
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -709,160 +944,109 @@ async def update_product(
             product.price = float(price)
         if category is not None:
             product.category = category
+        if latitude is not None or longitude is not None:
+            # Raises ValueError (422) unless both are given and in range
+            for name, value in product_location(latitude, longitude).items():
+                setattr(product, name, value)
             
         # Handle image updates if provided
+        new_image_paths = []
         if images and any(image.filename for image in images):
-            # Process current images
-            current_images = []
-            if hasattr(product, 'images') and product.images:
-                # Process PostgreSQL array format
-                if isinstance(product.images, str):
-                    images_str = product.images.strip('{}')
-                    current_images = [path.strip() for path in images_str.split(',') if path.strip()]
-                else:
-                    current_images = product.images if product.images else []
-            
-            # Process new images
-            new_image_paths = []
-            for image in images:
-                if image.filename:  # Check if a file was actually uploaded
-                    try:
-                        if not image.content_type.startswith('image/'):
-                            raise HTTPException(
-                                status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"File {image.filename} is not an image"
-                            )
-
-                        file_path = save_uploaded_file(image)
-                        with open(file_path, "wb") as f:
-                            content = await image.read()
-                            f.write(content)
-                        new_image_paths.append(file_path)
-                        logger.info(f"Saved new image: {file_path}")
-
-                    except HTTPException:
-                        raise
-                    except Exception as e:
-                        logger.error(f"Error saving image {image.filename}: {str(e)}")
-                        raise HTTPException(
-                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail=f"Error saving image: {str(e)}"
-                        )
-            
-            # Combine existing and new images
-            combined_images = current_images + new_image_paths
+            # Process new images (skip empty file fields)
+            try:
+                uploads = [image for image in images if image.filename]
+                new_images = await save_images(uploads)
+                new_image_paths = [image.path for image in new_images]
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.error(f"Error saving images: {str(e)}")
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Error saving image: {str(e)}"
+                )
             
-            # Convert to PostgreSQL array format
-            images_pg_array = "{" + ",".join(combined_images) + "}"
-            product.images = images_pg_array
+            # New images go after the existing ones
+            start = product.images[-1].position + 1 if product.images else 0
+            product.images.extend(product_images(new_images, start))
+            # Images live in their own table; touch the product so exports pick up the change
+            product.updated_at = utcnow()
+            await acquire_images(db, new_images, upload_restorer(uploads, new_images))
         
         # Save changes to database
-        db.commit()
-        db.refresh(product)
-        
-        logger.info(f"Product {product_id} updated successfully")
-        
-        # Process images for response
-        if hasattr(product, 'images') and product.images:
-            # Process PostgreSQL array format
-            if isinstance(product.images, str):
-                images_str = product.images.strip('{}')
-                image_paths = [path.strip() for path in images_str.split(',') if path.strip()]
-            else:
-                image_paths = product.images if product.images else []
-            
-            # Make paths appropriate for frontend
-            api_paths = []
-            for path in image_paths:
-                if path:
-                    parts = path.split('/')
-                    if len(parts) >= 2:
-                        if parts[0] == 'uploads':
-                            date_dir = parts[1]
-                            filename = '/'.join(parts[2:])
-                            api_paths.append(f"/uploads/{date_dir}/{filename}")
-                        else:
-                            api_paths.append(f"/uploads/{path}")
-                    else:
-                        api_paths.append(path)
-            
-            # Update the images attribute for response
-            product.images = api_paths
-        
-        return product
+        await db.commit()
+        await db.refresh(product)
         
     except HTTPException as he:
         logger.error(f"HTTP error while updating product: {str(he)}")
         raise he
+    except StaleDataError:
+        # Another request updated the product between our read and write (version_id_col)
+        logger.warning(f"Concurrent update of product {product_id}")
+        await discard_uploads(db, new_images)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Product was modified by another request, please retry"
+        )
     except ValueError as ve:
         logger.error(f"Validation error: {str(ve)}")
+        await discard_uploads(db, new_images)
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=f"Invalid data format: {str(ve)}"
         )
     except Exception as e:
         logger.error(f"Error updating product {product_id}: {str(e)}")
+        await discard_uploads(db, new_images)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error updating product"
         )
 
+    # The update is committed: nothing below may fail the request
+    await response_cache.invalidate(*product_namespaces(product.id, product.user_id))
+
+    # Resized variants are generated in the background, best effort
+    thumbnail_queue.submit(new_image_paths)
+
+    logger.info(f"Product {product_id} updated successfully")
+
+    # Process images for response
+    return ORJSONResponse(product_json(product))
+
 @router.post("/google-signup", response_model=UserResponse)
-async def google_signup(auth: GoogleAuth, db: Session = Depends(get_db)):
+async def google_signup(auth: GoogleAuth, db: AsyncSession = Depends(get_async_db)):
     """User signup with Google OAuth"""
     try:
-        # Verify the Google token
-        
-        CLIENT_ID = "96398954937-fro4o9nvvftfue7a5q3ghhm7bbs1kqi4.apps.googleusercontent.com"  # Replace with your Google Client ID
-        idinfo = id_token.verify_oauth2_token(auth.id_token, requests.Request(), CLIENT_ID)
-        
-        # Check if token is valid
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token issuer"
-            )
+        # Verify the Google token (signature, audience, expiry and issuer)
+        idinfo = await google_verifier.verify(auth.id_token)
         
         # Extract user information from token
         email = idinfo['email']
-        name = idinfo.get('name', '')
         
-        # Generate username from email if name is not available
-        username = name.replace(" ", "_").lower() if name else email.split('@')[0]
-        base_username = username
+        # Username from the Google name, or the email if there is none; base_N if taken
+        username = base_username(idinfo.get('name', ''), email)
         
         # Check if email already exists
-        if db.query(User).filter(User.email == email).first():
+        if (await db.scalars(select(User).where(User.email == email))).first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
-        # Make sure username is unique
-        counter = 1
-        while db.query(User).filter(User.username == username).first():
-            username = f"{base_username}_{counter}"
-            counter += 1
-        
-        # Create a random secure password for Google auth users
-        # They will authenticate via Google, not with this password
-        google_password = pwd_context.hash(os.urandom(24).hex())
-        
-        # Create new user
-        new_user = User(
-            username=username,
+        # Google users have no password; they authenticate via Google, not password login
+        new_user = await add_user(
+            db,
+            username,
             email=email,
-            password=google_password,  # Hashed random password
+            password=UNUSABLE_PASSWORD,
             joining_date=date.today(),
             contact_no=""
         )
-        
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.refresh(new_user)
         
         logger.info(f"User signed up with Google: {email}")
-        return new_user
+        return ORJSONResponse(user_json(new_user))
         
     except ValueError as e:
         # Invalid token
@@ -872,10 +1056,9 @@ async def google_signup(auth: GoogleAuth, db: Session = Depends(get_db)):
             detail="Invalid Google token"
         )
     except HTTPException as he:
-        print("jere")
         raise he
     except IntegrityError as ie:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database integrity error: {str(ie)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
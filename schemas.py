@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
-from datetime import date
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, List, Literal, Optional
+from datetime import date, datetime
 
 class UserCreate(BaseModel):
     username: str
@@ -30,15 +30,27 @@ class ProductCreate(BaseModel):
     type: str
     price: float
     category: str
+    # Optional location, both or neither
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class AdsAuth(BaseModel):
     id: int
+    limit: int = Field(50, ge=1, le=100)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+    sort: Literal["id", "price", "newest"] = "id"
+
+class ImageVariants(BaseModel):
+    # Resized copies of one image: width (px) -> URL
+    webp: Dict[int, str]
+    jpg: Dict[int, str]
 
 class ProductResponse(BaseModel):
     id: int
     title: str
-    images: List[str]  # List of image URLs
+    images: List[str]  # List of image URLs (full-size originals)
+    variants: List[ImageVariants] = []  # Resized copies of `images`, same order; use these in lists
     category: str
     price: float
     type: str
@@ -46,15 +58,39 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class NearbyProductResponse(ProductResponse):
+    distance_km: float  # Great-circle distance from the searched point
+
+# Paginated lists: pass next_cursor back as `cursor` for the next page (null on the last one)
+class UserListResponse(BaseModel):
+    items: List[UserResponse] = []
+    next_cursor: Optional[str] = None
+
+class ProductListResponse(BaseModel):
+    items: List[ProductResponse] = []
+    next_cursor: Optional[str] = None
+
+class NearbyProductListResponse(BaseModel):
+    items: List[NearbyProductResponse] = []
+    next_cursor: Optional[str] = None
+
 class AdsResponse(BaseModel):
     message: str
     adslist: List[ProductResponse] = []
+    next_cursor: Optional[str] = None
+
+class ProductSearchResponse(BaseModel):
+    items: List[ProductResponse] = []
+    next_cursor: Optional[str] = None
+    facets: Dict[str, Dict[str, int]] = {}  # facet -> value -> product count
 
 class ProductDetailResponse(BaseModel):
     title: str
     description: str
     city: str
     location: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     return_policy: str
     size: str  # Changed from dict to str
     images: List[str]  # List of image URLs
@@ -66,6 +102,24 @@ class ProductDetailResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductExport(BaseModel):
+    # One line of GET /products/export
+    id: int
+    title: str
+    description: Optional[str] = None
+    city: Optional[str] = None
+    location: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    return_policy: Optional[str] = None
+    size: Optional[str] = None
+    type: Optional[str] = None
+    price: float
+    category: Optional[str] = None
+    user_id: int
+    images: List[str] = []
+    updated_at: Optional[datetime] = None
+
 class Login(BaseModel):
     email: EmailStr
     password: str
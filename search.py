@@ -0,0 +1,216 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import and_, case, false, func, inspect, literal, literal_column, or_, select, text, tuple_, union_all
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import column, table
+from models import Product
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Text that is indexed for each product
+SEARCH_DOCUMENT = "coalesce(title, '') || ' ' || coalesce(description, '') || ' ' || coalesce(category, '')"
+
+# Postgres: GIN index over the tsvector expression. Queries must use the exact
+# same expression for the planner to pick the index.
+PG_TSVECTOR = f"to_tsvector('english', {SEARCH_DOCUMENT})"
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING GIN (({PG_TSVECTOR}))",
+]
+
+# SQLite: external-content FTS5 table kept in sync with products by triggers,
+# so every insert/update/delete (including bulk writes) updates the index.
+SQLITE_FTS_TABLE = "products_fts"
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        title, description, category,
+        content='products', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, description, category)
+        VALUES (new.id, new.title, new.description, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, description, category)
+        VALUES ('delete', old.id, old.title, old.description, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF title, description, category ON products BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, description, category)
+        VALUES ('delete', old.id, old.title, old.description, old.category);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, description, category)
+        VALUES (new.id, new.title, new.description, new.category);
+    END""",
+]
+
+products_fts = table(SQLITE_FTS_TABLE, column("rowid"))
+
+def ensure_search_index(connection):
+    """
+    Create the full-text index for the connection's database if it is missing
+    """
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+    elif dialect == "sqlite":
+        created = SQLITE_FTS_TABLE not in inspect(connection).get_table_names()
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if created:
+            # Index the rows that existed before the FTS table
+            connection.execute(text(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"))
+            logger.info("Built SQLite full-text index for products")
+    else:
+        logger.warning(f"Full-text search is not supported on {dialect}, searching with unindexed LIKE")
+
+def fts5_query(q: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last one as a prefix
+    """
+    tokens = re.findall(r"\w+", q)
+    if not tokens:
+        return ""
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def like_pattern(token: str) -> str:
+    """LIKE pattern matching token anywhere, with its wildcards escaped"""
+    return "%" + re.sub(r"([\\%_])", r"\\\1", token) + "%"
+
+# Columns that can be filtered on and are counted per value in facet results
+FACETS = {
+    "category": Product.category,
+    "city": Product.city,
+    "type": Product.type,
+    "size": Product.size,
+}
+# Maximum number of values returned per facet
+FACET_LIMIT = 50
+
+def product_filters(
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    type: Optional[str] = None,
+    size: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Build WHERE conditions keyed by the facet they filter on
+    """
+    conditions = {}
+    values = {"category": category, "city": city, "type": type, "size": size}
+    for name, value in values.items():
+        if value is not None:
+            conditions[name] = FACETS[name] == value
+    if min_price is not None:
+        conditions["min_price"] = Product.price >= min_price
+    if max_price is not None:
+        conditions["max_price"] = Product.price <= max_price
+    return conditions
+
+class TextMatch:
+    """
+    Dialect-specific pieces of a full-text match: the FROM clause, the match condition and a score
+    (lower is better)
+    """
+
+    def __init__(self, dialect: str, q: str):
+        if dialect == "postgresql":
+            tsquery = func.websearch_to_tsquery(literal_column("'english'"), q)
+            tsvector = literal_column(PG_TSVECTOR)
+            self.from_clause = Product.__table__
+            self.condition = tsvector.op("@@")(tsquery)
+            # Negated so that ascending order puts the best match first
+            self.score = -func.ts_rank(tsvector, tsquery)
+        elif dialect == "sqlite":
+            self.from_clause = Product.__table__.join(products_fts, products_fts.c.rowid == Product.id)
+            match = fts5_query(q)
+            # An empty query can't match anything
+            self.condition = literal_column(SQLITE_FTS_TABLE).op("MATCH")(match) if match else false()
+            self.score = func.bm25(literal_column(SQLITE_FTS_TABLE))
+        else:
+            # No full-text index: every word must appear in one of the indexed columns
+            self.from_clause = Product.__table__
+            tokens = re.findall(r"\w+", q)
+            searched = (Product.title, Product.description, Product.category)
+            self.condition = and_(*[
+                or_(*[column.ilike(like_pattern(token), escape="\\") for column in searched])
+                for token in tokens
+            ]) if tokens else false()
+            # Products with more of the words in their title first
+            self.score = -sum(
+                case((Product.title.ilike(like_pattern(token), escape="\\"), 1), else_=0) for token in tokens
+            ) if tokens else literal(0)
+
+async def search_products(
+    db: AsyncSession,
+    q: str,
+    limit: int,
+    after: Optional[Sequence[Any]] = None,
+    filters: Sequence = (),
+    columns: Sequence = (Product,),
+) -> List[Row]:
+    """
+    Return up to `limit` rows of `columns` (the Product entity by default) and
+    their `score` for products matching q, best match first.
+    Lower scores rank higher; `after` is the (score, id) of the previous page's last row.
+    """
+    match = TextMatch(db.bind.dialect.name, q)
+    query = (
+        select(*columns, match.score.label("score"))
+        .select_from(match.from_clause)
+        .where(match.condition, *filters)
+    )
+    if after is not None:
+        query = query.where(tuple_(match.score, Product.id) > tuple_(*after))
+    query = query.order_by(match.score, Product.id).limit(limit)
+    return (await db.execute(query)).all()
+
+async def facet_counts(
+    db: AsyncSession,
+    filters: Dict[str, Any],
+    q: Optional[str] = None,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Count matching products per value of each facet in a single query.
+    Each facet ignores its own filter, so clients can show the alternatives to the selected value.
+    """
+    from_clause = Product.__table__
+    base_conditions = []
+    if q:
+        match = TextMatch(db.bind.dialect.name, q)
+        from_clause = match.from_clause
+        base_conditions.append(match.condition)
+
+    queries = []
+    for name, facet_column in FACETS.items():
+        conditions = base_conditions + [
+            condition for key, condition in filters.items() if key != name
+        ]
+        queries.append(
+            select(
+                literal(name).label("facet"),
+                facet_column.label("value"),
+                func.count().label("count"),
+            )
+            .select_from(from_clause)
+            .where(*conditions)
+            .group_by(facet_column)
+        )
+
+    facets = {name: {} for name in FACETS}
+    for facet, value, count in (await db.execute(union_all(*queries))).all():
+        # Filtered here rather than in SQL so the planner picks the covering index
+        if value is not None:
+            facets[facet][value] = count
+
+    # Most common values first
+    return {
+        name: dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:FACET_LIMIT])
+        for name, counts in facets.items()
+    }
@@ -0,0 +1,71 @@
+"""
+Serializers that turn trusted ORM objects straight into JSON-ready dicts.
+
+Handlers return these wrapped in an ORJSONResponse, which skips FastAPI's
+response_model validation and jsonable_encoder pass. The schemas in
+schemas.py still document the responses in OpenAPI, and each serializer
+is checked against its schema's fields when this module is imported.
+"""
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Type
+from pydantic import BaseModel
+from listings import ProductListing
+from models import Product
+from schemas import ProductExport, ProductResponse, UserResponse
+from thumbnails import variant_urls
+
+def compile_serializer(schema: Type[BaseModel], **computed: Callable[[Any], Any]) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Build a function producing a dict with exactly the fields of `schema`, in order.
+    Fields are read as attributes of the same name unless a function is given in `computed`.
+    """
+    unknown = set(computed) - set(schema.model_fields)
+    if unknown:
+        raise ValueError(f"{schema.__name__} has no fields {sorted(unknown)}")
+    getters = [(name, computed.get(name) or attrgetter(name)) for name in schema.model_fields]
+
+    def serialize(obj: Any) -> Dict[str, Any]:
+        return {name: get(obj) for name, get in getters}
+
+    serialize.__name__ = f"serialize_{schema.__name__}"
+    return serialize
+
+def _image_urls(product: Product) -> List[str]:
+    return [image.url for image in product.images]
+
+def _to_date(value) -> Optional[date]:
+    # joining_date is a DateTime column, the API exposes the date
+    return value.date() if isinstance(value, datetime) else value
+
+product_json = compile_serializer(
+    ProductResponse,
+    images=_image_urls,
+    variants=lambda product: [variant_urls(image.url) for image in product.images],
+)
+
+# The same response from a listing row (see listings.py)
+product_listing_json = compile_serializer(
+    ProductResponse,
+    images=attrgetter("image_urls"),
+    variants=lambda listing: [variant_urls(url) for url in listing.image_urls],
+)
+
+product_export_json = compile_serializer(ProductExport, images=_image_urls)
+
+user_json = compile_serializer(
+    UserResponse,
+    joining_date=lambda user: _to_date(user.joining_date),
+)
+
+def nearby_json(listing: ProductListing, distance_km: float) -> Dict[str, Any]:
+    """NearbyProductResponse as a dict"""
+    return {**product_listing_json(listing), "distance_km": round(distance_km, 3)}
+
+def ads_json(message: str, products: List[ProductListing], next_cursor: Optional[str] = None) -> Dict[str, Any]:
+    """AdsResponse as a dict"""
+    return {
+        "message": message,
+        "adslist": [product_listing_json(product) for product in products],
+        "next_cursor": next_cursor,
+    }
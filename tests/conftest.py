@@ -0,0 +1,48 @@
+import os
+import sys
+import pytest
+
+# The app's modules live at the repository root
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+# datagen.py seeds the test databases
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# Seeded rows; products are spread over SEED_PRODUCTS // 20 users
+SEED_PRODUCTS = 60
+
+@pytest.fixture
+def seed_products():
+    """Number of products to seed; override in a test module for more"""
+    return SEED_PRODUCTS
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch, seed_products):
+    """
+    Sync engine on a fresh, seeded and migrated SQLite database. The working
+    directory is tmp_path, so uploads are written there.
+    """
+    import db
+    from datagen import seed
+    from migrations import migrate
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(db, "_engine", None)
+    monkeypatch.setattr(db, "_async_engine", None)
+    seed(db.get_engine(), seed_products)
+    migrate(db.get_engine())
+    yield db.get_engine()
+    if db._engine is not None:
+        db._engine.dispose()
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    """TestClient for the app on the `engine` database, with an empty response cache"""
+    from fastapi.testclient import TestClient
+    from cache import MemoryBackend, response_cache
+    import main
+
+    monkeypatch.setattr(response_cache, "backend", MemoryBackend())
+    with TestClient(main.app) as client:
+        yield client
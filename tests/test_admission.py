@@ -0,0 +1,48 @@
+import asyncio
+import httpx
+from fastapi import FastAPI
+from admission import ROUTE_POOLS, AdmissionController, AdmissionMiddleware
+
+def make_app(controller: AdmissionController, release: asyncio.Event) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/uploads/{file_path:path}")
+    async def serve_upload(file_path: str):
+        await release.wait()
+        return {"path": file_path}
+
+    @app.get("/products/{product_id}")
+    async def get_product(product_id: int):
+        return {"id": product_id}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller, enabled=True)
+    return app
+
+def test_image_traffic_does_not_shed_product_reads():
+    async def run():
+        controller = AdmissionController(
+            {"images": (2, 2, 5.0), "reads": (2, 2, 5.0), "default": (1, 0, 1.0)},
+            ROUTE_POOLS,
+        )
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=make_app(controller, release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Fill the images pool: two running, two queued
+            pending = [asyncio.create_task(client.get(f"/uploads/ab/{i}.png")) for i in range(4)]
+            for _ in range(100):
+                if controller.pools["images"].stats()["queue_depth"] == 2:
+                    break
+                await asyncio.sleep(0.01)
+
+            shed = await client.get("/uploads/ab/5.png")
+            product = await client.get("/products/1")
+
+            release.set()
+            served = await asyncio.gather(*pending)
+        return shed, product, served, controller
+
+    shed, product, served, controller = asyncio.run(run())
+    assert shed.status_code == 503
+    assert product.status_code == 200
+    assert [response.status_code for response in served] == [200] * 4
+    assert controller.pools["reads"].stats()["rejected"] == 0
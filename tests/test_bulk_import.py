@@ -0,0 +1,51 @@
+import io
+import zipfile
+from test_uploads import png, stored_files, uploaded_files
+
+HEADER = "title,description,city,location,return_policy,size,type,price,category,images\n"
+
+def row(title: str, images: str) -> str:
+    return f"{title},d,Lahore,l,7 days,M,used,10,home,{images}\n"
+
+def archive(**members: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip:
+        for name, data in members.items():
+            zip.writestr(f"{name}.png", data)
+    return buffer.getvalue()
+
+def run_import(client, manifest: str, images: bytes):
+    response = client.post(
+        "/products/import",
+        data={"user_id": "1"},
+        files=[
+            ("manifest", ("products.csv", manifest.encode(), "text/csv")),
+            ("images", ("images.zip", images, "application/zip")),
+        ],
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_rows_failing_on_a_later_image_leave_no_files(client, engine):
+    # a.png is stored before missing.png fails the row, and the batch ends up empty
+    report = run_import(client, HEADER + row("Lamp", "a.png|missing.png"), archive(a=png((1, 2, 3))))
+
+    assert report["imported"] == 0
+    assert report["failed"] == 1
+    assert uploaded_files() == []
+
+def test_failed_rows_files_are_removed_from_a_committed_batch(client, engine):
+    manifest = HEADER + row("Lamp", "a.png|missing.png") + row("Chair", "b.png")
+    report = run_import(client, manifest, archive(a=png((1, 2, 3)), b=png((4, 5, 6))))
+
+    assert report["imported"] == 1
+    files = uploaded_files()
+    assert len(files) == 1
+    assert list(stored_files(engine)) == [files[0].replace("\\", "/")]
+
+def test_image_of_a_failed_row_can_be_used_by_a_later_row(client, engine):
+    manifest = HEADER + row("Lamp", "a.png|missing.png") + row("Chair", "a.png")
+    report = run_import(client, manifest, archive(a=png((1, 2, 3))))
+
+    assert report["imported"] == 1
+    assert len(uploaded_files()) == 1
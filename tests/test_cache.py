@@ -0,0 +1,58 @@
+import asyncio
+from cache import MemoryBackend, ResponseCache, response_cache
+
+def test_invalidate_changes_the_keys_of_its_namespaces_only():
+    cache = ResponseCache(MemoryBackend())
+
+    async def run():
+        before = [await cache.key(["products"], 1), await cache.key(["product:1"], 1)]
+        await cache.set(before[0], {"stale": True})
+        await cache.invalidate("products")
+        after = [await cache.key(["products"], 1), await cache.key(["product:1"], 1)]
+        return before, after, await cache.get(after[0])
+
+    before, after, value = asyncio.run(run())
+    assert after[0] != before[0]
+    assert after[1] == before[1]
+    assert value is None
+
+def cached_reads(client, product_id: int, user_id: int):
+    """The product list, the product and its owner's ads, read twice so the second read is a cache hit"""
+    for _ in range(2):
+        products = client.get("/products", params={"limit": 100}).json()["items"]
+        detail = client.get(f"/products/{product_id}")
+        ads = client.post("/ads", json={"id": user_id, "limit": 100}).json()["adslist"]
+    return {product["id"]: product for product in products}, detail, {ad["id"]: ad for ad in ads}
+
+def test_update_invalidates_cached_reads(client):
+    user_id = client.get("/products/1").json()["user"]["id"]
+    cached_reads(client, 1, user_id)
+    hits = response_cache.hits
+
+    assert client.put("/products/1", data={"title": "Freshly renamed", "price": "12345"}).status_code == 200
+    products, detail, ads = cached_reads(client, 1, user_id)
+
+    assert response_cache.hits > hits
+    assert products[1]["title"] == "Freshly renamed"
+    assert detail.json()["price"] == 12345
+    assert ads[1]["title"] == "Freshly renamed"
+
+def test_delete_invalidates_cached_reads(client):
+    user_id = client.get("/products/1").json()["user"]["id"]
+    cached_reads(client, 1, user_id)
+
+    assert client.delete("/products/1").status_code == 200
+    products, detail, ads = cached_reads(client, 1, user_id)
+
+    assert 1 not in products
+    assert detail.status_code == 404
+    assert 1 not in ads
+
+def test_writes_leave_other_products_cached(client):
+    client.get("/products/2")
+    client.put("/products/1", data={"title": "Freshly renamed"})
+    hits = response_cache.hits
+
+    client.get("/products/2")
+
+    assert response_cache.hits == hits + 1
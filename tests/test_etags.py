@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import update
+from cache import response_cache
+from models import User
+
+READS = {
+    "products": lambda c, headers: c.get("/products", params={"limit": 10}, headers=headers),
+    "product": lambda c, headers: c.get("/products/1", headers=headers),
+    "ads": lambda c, headers: c.post("/ads", json={"id": 1, "limit": 10}, headers=headers),
+}
+
+@pytest.fixture(params=["cached", "uncached"])
+def reads(request, client, monkeypatch):
+    """The ETag'd reads, with and without the response cache in front of them"""
+    if request.param == "uncached":
+        monkeypatch.setattr(response_cache, "backend", None)
+    return READS
+
+@pytest.mark.parametrize("name", READS)
+def test_matching_if_none_match_returns_304(client, reads, name):
+    first = reads[name](client, {})
+    etag = first.headers["ETag"]
+
+    response = reads[name](client, {"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+@pytest.mark.parametrize("name", READS)
+def test_stale_if_none_match_returns_the_body(client, reads, name):
+    etag = reads[name](client, {}).headers["ETag"]
+
+    assert client.put("/products/1", data={"title": "Freshly renamed"}).status_code == 200
+    response = reads[name](client, {"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "Freshly renamed" in response.text
+
+def test_owner_change_changes_the_product_etag(client, engine, monkeypatch):
+    response = client.get("/products/1")
+    with engine.begin() as connection:
+        connection.execute(
+            update(User).where(User.id == response.json()["user"]["id"]).values(version=User.version + 1)
+        )
+    monkeypatch.setattr(response_cache, "backend", None)
+
+    assert client.get("/products/1", headers={"If-None-Match": response.headers["ETag"]}).status_code == 200
@@ -0,0 +1,65 @@
+import math
+import random
+import pytest
+from sqlalchemy import select
+from conftest import SEED_PRODUCTS
+from geo import covering_cells, geohash, haversine_km, product_location
+from models import Product
+from prefixes import starts_with
+from test_pagination import pages
+
+LAHORE = (31.5204, 74.3587)
+
+def test_geohash_matches_the_reference_encoding():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash(*LAHORE).startswith(geohash(*LAHORE, 5))
+
+def test_product_location_needs_both_coordinates():
+    assert product_location(None, None) == {"latitude": None, "longitude": None, "geohash": None}
+    with pytest.raises(ValueError):
+        product_location(31.5, None)
+    with pytest.raises(ValueError):
+        product_location(91, 74)
+
+@pytest.mark.parametrize("radius_km", [0.01, 0.5, 2, 10, 25, 100])
+def test_covering_cells_cover_the_circle(radius_km):
+    rng = random.Random(radius_km)
+    for _ in range(50):
+        latitude, longitude = rng.uniform(-60, 60), rng.uniform(-170, 170)
+        cells = covering_cells(latitude, longitude, radius_km)
+        assert 1 <= len(cells) <= 9
+        for step in range(36):
+            # A point just inside the circle, in every direction
+            bearing = math.radians(step * 10)
+            distance = radius_km * 0.999
+            point_lat = latitude + distance * math.cos(bearing) / 111.195
+            point_lon = longitude + distance * math.sin(bearing) / (111.195 * math.cos(math.radians(point_lat)))
+            assert geohash(point_lat, point_lon).startswith(tuple(cells))
+
+def test_prefix_range_matches_the_products_in_the_cell(engine):
+    prefix = geohash(*LAHORE, 4)
+    with engine.connect() as connection:
+        hashes = connection.scalars(select(Product.geohash)).all()
+        matched = connection.scalars(select(Product.geohash).where(starts_with("sqlite", Product.geohash, prefix))).all()
+    assert matched
+    assert sorted(matched) == sorted(value for value in hashes if value.startswith(prefix))
+
+@pytest.mark.parametrize("radius_km", [5, 25, 100])
+def test_nearby_returns_the_products_within_the_radius_nearest_first(client, engine, radius_km):
+    with engine.connect() as connection:
+        located = connection.execute(
+            select(Product.id, Product.latitude, Product.longitude).where(Product.latitude.is_not(None))
+        ).all()
+    assert len(located) == SEED_PRODUCTS
+    distances = {row.id: haversine_km(*LAHORE, row.latitude, row.longitude) for row in located}
+
+    items = pages(client, "/products/nearby", lat=LAHORE[0], lon=LAHORE[1], radius_km=radius_km, limit=2)
+
+    found = [item["id"] for item in items]
+    assert found
+    assert len(found) == len(set(found))
+    # The SQL filter uses an equirectangular distance, within 1% of the great-circle one
+    assert {id for id, distance in distances.items() if distance < radius_km * 0.99} <= set(found)
+    assert all(distances[id] < radius_km * 1.01 for id in found)
+    reported = [item["distance_km"] for item in items]
+    assert reported == sorted(reported)
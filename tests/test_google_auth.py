@@ -0,0 +1,39 @@
+import time
+import asyncio
+import threading
+from google_auth import GoogleTokenVerifier
+
+class CountingVerifier(GoogleTokenVerifier):
+    """Serves fixed certs from a slow fake fetch and counts the fetches"""
+
+    def __init__(self):
+        super().__init__("client-id")
+        self.fetches = 0
+        self._fetches_lock = threading.Lock()
+
+    def _fetch_certs(self):
+        with self._fetches_lock:
+            self.fetches += 1
+        time.sleep(0.05)
+        return {"kid-1": "cert"}, 3600
+
+def test_concurrent_cold_get_certs_fetch_once():
+    verifier = CountingVerifier()
+
+    async def run():
+        return await asyncio.gather(*(verifier.get_certs() for _ in range(20)))
+
+    results = asyncio.run(run())
+    assert verifier.fetches == 1
+    assert all(certs == {"kid-1": "cert"} for certs in results)
+
+def test_concurrent_forced_refreshes_fetch_once():
+    verifier = CountingVerifier()
+
+    async def run():
+        await verifier.get_certs()
+        await asyncio.gather(*(verifier.refresh() for _ in range(20)))
+
+    asyncio.run(run())
+    # One cold fetch, then a single refresh shared by every queued caller
+    assert verifier.fetches == 2
@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from metrics import RequestDBStats, _request_db_stats, install_query_hooks
+
+def test_failed_statement_does_not_leak_start_time():
+    install_query_hooks()
+    engine = create_engine("sqlite://")
+    stats = RequestDBStats()
+    token = _request_db_stats.set(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            assert conn.info.get("query_start_time") == []
+            conn.execute(text("SELECT 1"))
+            assert conn.info.get("query_start_time") == []
+    finally:
+        _request_db_stats.reset(token)
+    assert stats.queries == 2
@@ -0,0 +1,51 @@
+import pytest
+from fastapi import HTTPException
+from conftest import SEED_PRODUCTS
+from pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("price", [1500.5, 42])
+    assert decode_cursor(cursor, "price") == [1500.5, 42]
+
+def test_cursor_for_another_sort_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor("price", [1500.5, 42]), "id")
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor("id", [1])[:-3] + "!!!", "W10"])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "id")
+    assert error.value.status_code == 400
+
+def pages(client, path, **params):
+    """Every item of a paginated listing, following next_cursor"""
+    items = []
+    cursor = None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        items.extend(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items
+
+def test_users_pages_cover_every_user_once(client):
+    users = pages(client, "/all_users", limit=1)
+    assert [user["id"] for user in users] == list(range(1, SEED_PRODUCTS // 20 + 1))
+
+@pytest.mark.parametrize("sort", ["id", "price", "newest"])
+def test_product_pages_cover_every_product_once(client, sort):
+    products = pages(client, "/products", limit=7, sort=sort)
+    assert sorted(product["id"] for product in products) == list(range(1, SEED_PRODUCTS + 1))
+    if sort == "price":
+        prices = [product["price"] for product in products]
+        assert prices == sorted(prices)
+
+def test_tampered_cursor_returns_400(client):
+    assert client.get("/products", params={"cursor": "garbage"}).status_code == 400
+    cursor = client.get("/products", params={"limit": 5, "sort": "price"}).json()["next_cursor"]
+    assert client.get("/products", params={"cursor": cursor, "sort": "id"}).status_code == 400
+    # Right sort, wrong number of key values
+    assert client.get("/products", params={"cursor": encode_cursor("price", [1]), "sort": "price"}).status_code == 400
@@ -0,0 +1,133 @@
+"""
+Query budgets per endpoint: each endpoint runs against a freshly seeded SQLite
+database with the response cache off, and must not execute more SQL statements
+than its budget. Page sizes are well above the budgets, so a relationship
+loaded per row (N+1) can't slip in unnoticed.
+"""
+import io
+import json
+import zipfile
+from typing import Callable, List, NamedTuple, Optional
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from cache import response_cache
+
+PRODUCTS = 500
+PAGE_SIZE = 50
+IMPORT_ROWS = 20
+
+class Case(NamedTuple):
+    name: str
+    budget: int
+    request: Callable
+    # Sent first and not measured, for the state the request needs
+    prepare: Optional[Callable] = None
+    # Send the request once, then measure it again with the ETag in If-None-Match (expects 304)
+    revalidate: bool = False
+
+def png_bytes(color) -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def product_form(**fields):
+    form = {
+        "title": "Oak chair", "description": "Barely used", "city": "Lahore", "location": "Block 4",
+        "return_policy": "7 days", "size": "M", "type": "used", "price": "1500", "category": "furniture",
+    }
+    form.update(fields)
+    return form
+
+def import_files():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for n in range(3):
+            zf.writestr(f"{n}.png", png_bytes((n * 60, 0, 0)))
+    manifest = "".join(
+        json.dumps({**product_form(price=100 + n), "images": [f"{n % 3}.png"]}) + "\n" for n in range(IMPORT_ROWS)
+    )
+    return {
+        "manifest": ("products.ndjson", manifest.encode(), "application/x-ndjson"),
+        "images": ("images.zip", archive.getvalue(), "application/zip"),
+    }
+
+def signup(client):
+    return client.post("/signup", json={
+        "username": "budget", "email": "budget@example.com", "password": "secret123", "contact_no": "1",
+    })
+
+def create_product(client):
+    # The new product is PRODUCTS + 1 on the fresh database
+    return client.post("/products", data=product_form(user_id="1"), files=[
+        ("images", ("a.png", png_bytes((255, 0, 0)), "image/png")),
+        ("images", ("b.png", png_bytes((0, 255, 0)), "image/png")),
+    ])
+
+CASES = [
+    Case("GET /products", 2, lambda c: c.get(f"/products?limit={PAGE_SIZE}")),
+    Case("GET /products (filtered, by price)", 2,
+         lambda c: c.get(f"/products?limit={PAGE_SIZE}&category=furniture&min_price=100&sort=price")),
+    Case("GET /products/search", 3, lambda c: c.get(f"/products/search?q=chair&limit={PAGE_SIZE}")),
+    Case("GET /products/search (no query)", 3, lambda c: c.get(f"/products/search?limit={PAGE_SIZE}")),
+    # Sparse data: the search circle widens 2 -> 8 -> 25 km before the page and its images are loaded
+    Case("GET /products/nearby", 5, lambda c: c.get(f"/products/nearby?lat=31.52&lon=74.36&radius_km=25&limit={PAGE_SIZE}")),
+    Case("GET /products/{id}", 2, lambda c: c.get("/products/1")),
+    Case("GET /products (revalidated)", 1, lambda c: c.get(f"/products?limit={PAGE_SIZE}"), revalidate=True),
+    Case("GET /products/{id} (revalidated)", 1, lambda c: c.get("/products/1"), revalidate=True),
+    Case("POST /ads (revalidated)", 1, lambda c: c.post("/ads", json={"id": 1, "limit": PAGE_SIZE}), revalidate=True),
+    Case("GET /products/export", 2, lambda c: c.get("/products/export")),
+    Case("GET /all_users", 1, lambda c: c.get(f"/all_users?limit={PAGE_SIZE}")),
+    Case("POST /ads", 2, lambda c: c.post("/ads", json={"id": 1, "limit": PAGE_SIZE})),
+    Case("POST /signup", 4, signup),
+    Case("POST /login", 1, lambda c: c.post("/login", json={"email": "budget@example.com", "password": "secret123"}),
+         prepare=signup),
+    Case("POST /users", 4, lambda c: c.post("/users", json={
+        "username": "plain", "email": "plain@example.com", "password": "secret123", "contact_no": "1",
+    })),
+    # SQLite can't keep multi-row INSERT ... RETURNING in order, so SQLAlchemy inserts
+    # RETURNING rows one at a time there; PostgreSQL batches them into one statement.
+    # Hence one INSERT per image below, and per product for the import
+    Case("POST /products", 7, create_product),
+    Case("PUT /products/{id}", 7, lambda c: c.put(f"/products/{PRODUCTS + 1}", data={"price": "1200"}, files=[
+        ("images", ("c.png", png_bytes((0, 0, 255)), "image/png")),
+    ]), prepare=create_product),
+    Case("POST /products/import", IMPORT_ROWS + 3, lambda c: c.post("/products/import", data={"user_id": "1"}, files=import_files())),
+    Case("DELETE /products/{id}", 6, lambda c: c.delete(f"/products/{PRODUCTS + 1}"), prepare=create_product),
+]
+
+@pytest.fixture
+def seed_products():
+    return PRODUCTS
+
+@pytest.fixture
+def statements():
+    """SQL statements executed on any engine while recording[0] is True"""
+    recorded: List[str] = []
+    recording = [False]
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if recording[0]:
+            recorded.append(" ".join(statement.split()))
+
+    event.listen(Engine, "before_cursor_execute", record)
+    yield recorded, recording
+    event.remove(Engine, "before_cursor_execute", record)
+
+@pytest.mark.parametrize("case", CASES, ids=[case.name for case in CASES])
+def test_query_budget(client, statements, monkeypatch, case):
+    recorded, recording = statements
+    # Every request reaches the database
+    monkeypatch.setattr(response_cache, "backend", None)
+    if case.prepare:
+        assert case.prepare(client).status_code < 400
+    if case.revalidate:
+        client.headers["If-None-Match"] = case.request(client).headers["ETag"]
+
+    recording[0] = True
+    response = case.request(client)
+    recording[0] = False
+
+    assert response.status_code == (304 if case.revalidate else 200), response.text
+    assert len(recorded) <= case.budget, "\n".join([f"{len(recorded)} queries (budget {case.budget}):", *recorded])
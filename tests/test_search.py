@@ -0,0 +1,12 @@
+def test_search_cursor_is_bound_to_its_query(client):
+    title = client.get("/products/1").json()["title"]
+    word = title.split()[0]
+    first = client.get("/products/search", params={"q": word, "limit": 1}).json()
+    assert first["next_cursor"]
+
+    same = client.get("/products/search", params={"q": word, "limit": 1, "cursor": first["next_cursor"]})
+    assert same.status_code == 200
+    assert same.json()["items"][0]["id"] != first["items"][0]["id"]
+
+    other = client.get("/products/search", params={"q": f"{word}s", "limit": 1, "cursor": first["next_cursor"]})
+    assert other.status_code == 400
@@ -0,0 +1,77 @@
+import io
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from sqlalchemy import func, select
+import thumbnails
+from models import Product
+from thumbnails import ThumbnailQueue, thumbnail_queue
+
+class FakeExecutor:
+    """Runs nothing; hands back futures the test completes"""
+
+    def __init__(self, broken: bool = False):
+        self.broken = broken
+        self.futures = []
+        self.shut_down = False
+
+    def submit(self, fn, path):
+        if self.broken:
+            raise BrokenProcessPool("A child process terminated abruptly")
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+def test_broken_pool_is_replaced(monkeypatch):
+    started = []
+    monkeypatch.setattr(thumbnails, "ProcessPoolExecutor", lambda **kwargs: started.append(FakeExecutor()) or started[-1])
+    queue = ThumbnailQueue()
+    broken = FakeExecutor(broken=True)
+    queue._executor = broken
+
+    queue.submit(["uploads/ab/a.png"])
+
+    assert broken.shut_down
+    assert queue._executor is started[0]
+    assert queue.pending == 1
+    started[0].futures[0].set_result([])
+    assert queue.stats()["pending"] == 0
+    assert queue.stats()["completed"] == 1
+
+def test_submit_failure_is_logged_not_raised(monkeypatch):
+    monkeypatch.setattr(thumbnails, "ProcessPoolExecutor", lambda **kwargs: FakeExecutor(broken=True))
+    queue = ThumbnailQueue()
+
+    queue.submit(["uploads/ab/a.png", "uploads/ab/b.png"])
+
+    assert queue.stats()["pending"] == 0
+    assert queue.stats()["failed"] == 2
+    # The broken pool isn't kept around for the next request
+    assert queue._executor is None
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def test_create_product_succeeds_when_thumbnails_cannot_be_queued(client, engine, monkeypatch):
+    def broken_submit(path):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    monkeypatch.setattr(thumbnail_queue, "_submit", broken_submit)
+    pending = thumbnail_queue.pending
+    form = {
+        "title": "Thumbnail-less lamp", "description": "d", "city": "Lahore", "location": "l",
+        "return_policy": "7 days", "size": "M", "type": "used", "price": "10", "category": "home", "user_id": "1",
+    }
+
+    response = client.post("/products", data=form, files=[("images", ("a.png", png_bytes(), "image/png"))])
+
+    assert response.status_code == 200, response.text
+    with engine.connect() as connection:
+        count = connection.scalar(select(func.count()).where(Product.title == "Thumbnail-less lamp"))
+    assert count == 1
+    assert thumbnail_queue.pending == pending
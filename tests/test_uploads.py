@@ -0,0 +1,66 @@
+import io
+import os
+import pytest
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+import routes
+from models import StoredFile
+from uploads import acquire_images
+
+FORM = {
+    "title": "Oak chair", "description": "d", "city": "Lahore", "location": "l",
+    "return_policy": "7 days", "size": "M", "type": "used", "price": "10", "category": "home", "user_id": "1",
+}
+
+def png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def uploaded_files():
+    return [os.path.join(root, name) for root, _, names in os.walk("uploads") for name in names]
+
+def stored_files(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(select(StoredFile.path, StoredFile.refcount)).all())
+
+def fail_after_acquire(error):
+    async def acquire(*args):
+        await acquire_images(*args)
+        raise error
+    return acquire
+
+def test_failed_create_removes_the_files_it_wrote(client, engine, monkeypatch):
+    monkeypatch.setattr(routes, "acquire_images", fail_after_acquire(RuntimeError("database went away")))
+
+    response = client.post("/products", data=FORM, files=[("images", ("a.png", png((1, 2, 3)), "image/png"))])
+
+    assert response.status_code == 500
+    assert uploaded_files() == []
+    assert stored_files(engine) == {}
+
+def test_failed_create_keeps_files_other_products_use(client, engine, monkeypatch):
+    image = png((4, 5, 6))
+    assert client.post("/products", data=FORM, files=[("images", ("a.png", image, "image/png"))]).status_code == 200
+    kept = uploaded_files()
+
+    monkeypatch.setattr(routes, "acquire_images", fail_after_acquire(RuntimeError("database went away")))
+    response = client.post("/products", data=FORM, files=[
+        ("images", ("a.png", image, "image/png")),
+        ("images", ("b.png", png((7, 8, 9)), "image/png")),
+    ])
+
+    assert response.status_code == 500
+    assert uploaded_files() == kept
+    assert list(stored_files(engine).values()) == [1]
+
+@pytest.mark.parametrize("error, status", [(StaleDataError("version mismatch"), 409), (RuntimeError("boom"), 500)])
+def test_failed_update_removes_the_files_it_wrote(client, engine, monkeypatch, error, status):
+    monkeypatch.setattr(routes, "acquire_images", fail_after_acquire(error))
+
+    response = client.put("/products/1", data={"price": "12"}, files=[("images", ("a.png", png((1, 1, 1)), "image/png"))])
+
+    assert response.status_code == status
+    assert uploaded_files() == []
+    assert stored_files(engine) == {}
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+import usernames
+from db import async_session
+from models import User
+from usernames import add_user, is_username_conflict, next_username
+
+FIELDS = {"password": "!", "contact_no": ""}
+
+@pytest.mark.parametrize("taken, expected", [
+    ([], "bob"),
+    (["bob"], "bob_1"),
+    (["bob", "bob_1"], "bob_2"),
+    (["bob", "bob_1", "bob_7", "bob_x", "bobby_9"], "bob_8"),
+    (["bob_1"], "bob"),
+])
+def test_next_username(taken, expected):
+    assert next_username("bob", taken) == expected
+
+def test_add_user_takes_the_next_free_suffix(engine):
+    async def run():
+        async with async_session() as db:
+            return [(await add_user(db, "bob", email=f"bob{n}@example.com", **FIELDS)).username for n in range(3)]
+
+    assert asyncio.run(run()) == ["bob", "bob_1", "bob_2"]
+
+def test_add_user_allocates_again_after_a_concurrent_insert(engine, monkeypatch):
+    allocate = usernames.allocate_username
+    calls = []
+
+    async def stale_allocate(db, base):
+        calls.append(base)
+        # The first allocation misses the "bob" a concurrent request inserted
+        return base if len(calls) == 1 else await allocate(db, base)
+
+    monkeypatch.setattr(usernames, "allocate_username", stale_allocate)
+
+    async def run():
+        async with async_session() as db:
+            await add_user(db, "bob", email="first@example.com", **FIELDS)
+            calls.clear()
+            return (await add_user(db, "bob", email="second@example.com", **FIELDS)).username
+
+    assert asyncio.run(run()) == "bob_1"
+    assert calls == ["bob", "bob"]
+
+def test_add_user_raises_other_integrity_errors(engine):
+    async def run():
+        async with async_session() as db:
+            await add_user(db, "bob", email="bob@example.com", **FIELDS)
+            with pytest.raises(IntegrityError):
+                await add_user(db, "robert", email="bob@example.com", **FIELDS)
+            return (await db.scalars(select(User.username).where(User.email == "bob@example.com"))).all()
+
+    assert asyncio.run(run()) == ["bob"]
+
+def integrity_error(orig) -> IntegrityError:
+    return IntegrityError("INSERT INTO users ...", {}, orig)
+
+class UniqueViolation(Exception):
+    def __init__(self, message, constraint_name):
+        super().__init__(message)
+        self.diag = SimpleNamespace(constraint_name=constraint_name)
+
+def test_username_conflict_from_the_constraint_name():
+    assert is_username_conflict(integrity_error(UniqueViolation("duplicate key", "ix_users_username")))
+    # Postgres messages quote the row, which may well contain "username"
+    assert not is_username_conflict(integrity_error(
+        UniqueViolation('duplicate key value violates unique constraint "ix_users_email" (email)=(username@x)', "ix_users_email")
+    ))
+
+def test_username_conflict_from_an_asyncpg_error():
+    cause = Exception("duplicate key")
+    cause.constraint_name = "ix_users_username"
+    orig = Exception("<class 'asyncpg.exceptions.UniqueViolationError'>: duplicate key")
+    orig.__cause__ = cause
+    assert is_username_conflict(integrity_error(orig))
+
+def test_username_conflict_from_sqlite_messages():
+    assert is_username_conflict(integrity_error(Exception("UNIQUE constraint failed: users.username")))
+    assert not is_username_conflict(integrity_error(Exception("UNIQUE constraint failed: users.email")))
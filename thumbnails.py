@@ -0,0 +1,194 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Widths (px) of the resized copies stored next to each original
+VARIANT_WIDTHS = (320, 640, 1280)
+# File extension -> Pillow format
+VARIANT_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+VARIANT_QUALITY = 80
+
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+def variant_path(path: str, width: int, ext: str) -> str:
+    """
+    Path of a resized copy: uploads/20250403/x.jpeg -> uploads/20250403/x.jpeg.w320.webp
+    """
+    return f"{path}.w{width}.{ext}"
+
+def variant_paths(path: str) -> List[str]:
+    return [variant_path(path, width, ext) for width in VARIANT_WIDTHS for ext in VARIANT_FORMATS]
+
+def variant_urls(url: str) -> Dict[str, Dict[int, str]]:
+    """
+    URLs of every variant of an image, keyed by format then width
+    """
+    return {
+        ext: {width: variant_path(url, width, ext) for width in VARIANT_WIDTHS}
+        for ext in VARIANT_FORMATS
+    }
+
+def generate_variants(path: str) -> List[str]:
+    """
+    Write every width/format variant of one image. Runs in a worker process.
+    """
+    # Imported here so the API process doesn't pay for Pillow at startup
+    from PIL import Image, ImageOps
+
+    # The product may have been deleted before the job ran
+    if not os.path.exists(path):
+        return []
+    # Content-addressed originals are shared, so their variants may already exist
+    if all(os.path.exists(variant) for variant in variant_paths(path)):
+        return []
+
+    written = []
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        for width in VARIANT_WIDTHS:
+            # Never upscale; small originals are just re-encoded
+            target_width = min(width, image.width)
+            target_height = max(1, round(image.height * target_width / image.width))
+            resized = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+
+            for ext, image_format in VARIANT_FORMATS.items():
+                output = resized.convert("RGB") if image_format == "JPEG" else resized
+                destination = variant_path(path, width, ext)
+                # Per-process temp name: two workers may render the same shared original
+                part_path = f"{destination}.{os.getpid()}.part"
+                output.save(part_path, format=image_format, quality=VARIANT_QUALITY, optimize=True)
+                os.replace(part_path, destination)
+                written.append(destination)
+    return written
+
+class ThumbnailQueue:
+    """
+    Fire-and-forget queue of variant jobs running in a process pool
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn rather than fork: the API process has threads and an event loop
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                    logger.info(f"Started thumbnail process pool with {self.workers} workers")
+        return self._executor
+
+    def _done(self, path: str, future: Future):
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if future.exception() is not None:
+            logger.error(f"Error generating variants for {path}: {str(future.exception())}")
+
+    def _discard_broken(self, executor: ProcessPoolExecutor):
+        """Drop a pool whose worker died (crash, OOM kill); the next job starts a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Thumbnail process pool is broken, restarting it")
+
+    def _submit(self, path: str) -> Future:
+        # A pool that broke since the last job is replaced once
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return executor.submit(generate_variants, path)
+            except BrokenProcessPool:
+                self._discard_broken(executor)
+                if attempt:
+                    raise
+
+    def submit(self, paths: List[str]):
+        """
+        Queue variant generation for newly saved images. Best effort: errors are
+        logged, never raised, as the images are already saved and in use.
+        """
+        for path in dict.fromkeys(paths):
+            with self._lock:
+                self.pending += 1
+            try:
+                future = self._submit(path)
+            except Exception as e:
+                with self._lock:
+                    self.pending -= 1
+                    self.failed += 1
+                logger.error(f"Could not queue variants for {path}: {str(e)}")
+                continue
+            future.add_done_callback(lambda f, path=path: self._done(path, f))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def shutdown(self, wait: bool = False):
+        """Stop the pool; with wait, finish queued jobs first instead of cancelling them"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+thumbnail_queue = ThumbnailQueue(workers=THUMBNAIL_WORKERS)
+
+def remove_variants(path: str):
+    """Delete the variants of an image that is being removed"""
+    for variant in variant_paths(path):
+        if os.path.exists(variant):
+            try:
+                os.remove(variant)
+            except OSError as e:
+                logger.warning(f"Could not delete image variant {variant}: {str(e)}")
+
+if __name__ == "__main__":
+    # Backfill variants for images uploaded before variants existed
+    import sys
+    from uploads import UPLOAD_DIR, detect_image_type
+
+    root = sys.argv[1] if len(sys.argv) > 1 else UPLOAD_DIR
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            is_variant = ".w" in filename and filename.endswith(tuple(VARIANT_FORMATS))
+            if is_variant or os.path.exists(variant_paths(path)[-1]):
+                continue
+            with open(path, "rb") as f:
+                if detect_image_type(f.read(16)) is None:
+                    continue
+            try:
+                generate_variants(path)
+                logger.info(f"Generated variants for {path}")
+            except Exception as e:
+                logger.error(f"Error generating variants for {path}: {str(e)}")
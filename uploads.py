@@ -0,0 +1,411 @@
+import os
+import re
+import asyncio
+import logging
+import hashlib
+import tempfile
+import threading
+from collections import Counter
+from typing import Any, BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from db import async_session
+from models import StoredFile
+from thumbnails import remove_variants
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configure uploads
+UPLOAD_DIR = "uploads"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+CHUNK_SIZE = 256 * 1024
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+MAX_REQUEST_IMAGE_BYTES = int(os.getenv("MAX_REQUEST_IMAGE_BYTES", str(100 * 1024 * 1024)))
+# Number of images processed at the same time per request
+UPLOAD_WRITE_CONCURRENCY = int(os.getenv("UPLOAD_WRITE_CONCURRENCY", "4"))
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """
+    Identify an image from its first bytes, returning its format or None
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    if header[4:8] == b"ftyp" and header[8:12] in (b"heic", b"heix", b"hevc", b"mif1", b"msf1", b"avif"):
+        return "heic"
+    return None
+
+class ByteBudget:
+    """
+    Thread-safe byte allowance shared by all images of one request
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self, size: int) -> bool:
+        with self._lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+class StoredImage(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    # False when identical content was already stored and nothing was written
+    written: bool
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+def blob_path(sha256: str, image_type: str) -> str:
+    """
+    Content-addressed location of a file: uploads/ab/ab12...ef.jpeg
+    """
+    return os.path.join(UPLOAD_DIR, sha256[:2], f"{sha256}.{image_type}")
+
+def public_url(path: str) -> str:
+    """
+    URL an uploaded file is served from: uploads/ab/ab12...ef.jpeg -> /uploads/ab/ab12...ef.jpeg
+    """
+    path = path.replace(os.sep, "/")
+    if path.startswith(f"{UPLOAD_DIR}/"):
+        path = path[len(UPLOAD_DIR) + 1:]
+    return f"/uploads/{path}"
+
+def image_size(source: BinaryIO) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Read (width, height) from an image header, or (None, None) for formats Pillow can't open
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    source.seek(0)
+    try:
+        with Image.open(source) as image:
+            return image.size
+    except (UnidentifiedImageError, OSError):
+        return None, None
+
+def hash_image(source: BinaryIO, filename: str, budget: ByteBudget) -> Tuple[str, str, int]:
+    """
+    Stream an uploaded image once, validating it and computing its SHA-256.
+    Returns (sha256, image type, size).
+    """
+    digest = hashlib.sha256()
+    image_type = None
+    size = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if image_type is None:
+            image_type = detect_image_type(chunk[:16])
+            if image_type is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"File {filename} is not an image"
+                )
+        size += len(chunk)
+        if size > MAX_IMAGE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File {filename} is larger than {MAX_IMAGE_BYTES} bytes"
+            )
+        if not budget.take(len(chunk)):
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Images are larger than {MAX_REQUEST_IMAGE_BYTES} bytes in total"
+            )
+        digest.update(chunk)
+    if image_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {filename} is empty"
+        )
+    return digest.hexdigest(), image_type, size
+
+def copy_file(source: BinaryIO, file_path: str):
+    """
+    Copy source to file_path chunk by chunk through a temp file, so readers never see a partial file
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    fd, part_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+        # mkstemp creates files readable by the owner only
+        os.chmod(part_path, 0o644)
+        os.replace(part_path, file_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+def store_image(source: BinaryIO, filename: str, budget: ByteBudget) -> StoredImage:
+    """
+    Validate and hash an uploaded image, then write it unless identical content is already stored.
+    The file may still be removed before acquire_images locks its row; acquire_images writes it again.
+    Blocking: runs in a worker thread.
+    """
+    sha256, image_type, size = hash_image(source, filename, budget)
+    width, height = image_size(source)
+    file_path = blob_path(sha256, image_type)
+    if os.path.exists(file_path):
+        return StoredImage(file_path, sha256, size, False, width, height)
+
+    source.seek(0)
+    copy_file(source, file_path)
+    return StoredImage(file_path, sha256, size, True, width, height)
+
+async def save_images(images: List[UploadFile]) -> List[StoredImage]:
+    """
+    Validate and store uploaded images concurrently, off the event loop.
+    Either every image is saved or none of the newly written ones are kept.
+    """
+    for image in images:
+        if not image.content_type or not image.content_type.startswith('image/'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File {image.filename} is not an image"
+            )
+        # Reject obviously oversized files before reading anything
+        if image.size is not None and image.size > MAX_IMAGE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File {image.filename} is larger than {MAX_IMAGE_BYTES} bytes"
+            )
+
+    budget = ByteBudget(MAX_REQUEST_IMAGE_BYTES)
+    semaphore = asyncio.Semaphore(UPLOAD_WRITE_CONCURRENCY)
+
+    async def save(image: UploadFile) -> StoredImage:
+        async with semaphore:
+            await image.seek(0)
+            stored = await run_in_threadpool(store_image, image.file, image.filename, budget)
+            if stored.written:
+                logger.info(f"Saved image: {stored.path}")
+            else:
+                logger.info(f"Image {image.filename} already stored as {stored.path}")
+            return stored
+
+    results = await asyncio.gather(*(save(image) for image in images), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        # Don't leave files behind that only this request wrote
+        await discard_images([result for result in results if isinstance(result, StoredImage)])
+        raise errors[0]
+    return results
+
+def rewrite_image(source: BinaryIO, image: StoredImage):
+    """Write a stored image's file again from its source. Blocking: runs in a worker thread."""
+    source.seek(0)
+    copy_file(source, image.path)
+    logger.info(f"Rewrote image removed by a concurrent request: {image.path}")
+
+def upload_restorer(uploads: List[UploadFile], images: List[StoredImage]) -> Callable[[StoredImage], None]:
+    """restore callable for acquire_images, for images returned by save_images(uploads)"""
+    sources = {image.path: upload.file for upload, image in zip(uploads, images)}
+    return lambda image: rewrite_image(sources[image.path], image)
+
+# Dialects with INSERT ... ON CONFLICT
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+async def _upsert(db: AsyncSession, rows: List[Dict[str, Any]], add_refcount: bool):
+    """
+    Insert stored_files rows, sorted by sha256 so concurrent requests lock them in the same order.
+    A row that already exists gets the new refcount added (add_refcount) or is left as it is.
+    """
+    upsert_insert = UPSERT_INSERTS.get(db.bind.dialect.name)
+    if upsert_insert is not None:
+        # One executemany statement
+        statement = upsert_insert(StoredFile)
+        if add_refcount:
+            statement = statement.on_conflict_do_update(
+                index_elements=[StoredFile.sha256],
+                set_={"refcount": StoredFile.refcount + statement.excluded.refcount},
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=[StoredFile.sha256])
+        await db.execute(statement, rows)
+        return
+
+    # Other dialects: lock the rows that exist, update them and insert the rest.
+    # A concurrent insert of the same new file fails the transaction on the primary key.
+    existing = set(await db.scalars(
+        select(StoredFile.sha256)
+        .where(StoredFile.sha256.in_([row["sha256"] for row in rows]))
+        .order_by(StoredFile.sha256)
+        .with_for_update()
+    ))
+    if add_refcount:
+        for row in rows:
+            if row["sha256"] in existing:
+                await db.execute(
+                    update(StoredFile)
+                    .where(StoredFile.sha256 == row["sha256"])
+                    .values(refcount=StoredFile.refcount + row["refcount"])
+                )
+    new_rows = [row for row in rows if row["sha256"] not in existing]
+    if new_rows:
+        await db.execute(insert(StoredFile), new_rows)
+
+async def acquire_images(db: AsyncSession, images: List[StoredImage], restore: Callable[[StoredImage], None]):
+    """
+    Add one reference per image, in the caller's transaction, with a single executemany upsert
+    where the dialect has one.
+    Files are only unlinked by purge_images while it holds their row, so once the upsert has
+    locked the rows the files stay until commit. Files a concurrent purge removed before that
+    are written again with restore (blocking, run in a worker thread).
+    """
+    if not images:
+        return
+    counts = Counter(image.sha256 for image in images)
+    by_sha256 = {image.sha256: image for image in images}
+    await _upsert(db, [
+        {"sha256": sha256, "path": by_sha256[sha256].path, "size": by_sha256[sha256].size, "refcount": count}
+        for sha256, count in sorted(counts.items())
+    ], add_refcount=True)
+    for image in by_sha256.values():
+        if not os.path.exists(image.path):
+            await run_in_threadpool(restore, image)
+
+async def release_images(db: AsyncSession, paths: List[str]) -> List[str]:
+    """
+    Drop one reference per path, in the caller's transaction. Unreferenced rows are kept
+    at refcount 0 for purge_images; returns the paths that aren't content-addressed,
+    which the caller unlinks after committing.
+    """
+    # One UPDATE per distinct reference count (usually just one), not one per image
+    groups = {}
+    for path, count in Counter(paths).items():
+        groups.setdefault(count, []).append(path)
+    refcounts = {}
+    for count, group in groups.items():
+        result = await db.execute(
+            update(StoredFile)
+            .where(StoredFile.path.in_(group))
+            .values(refcount=StoredFile.refcount - count)
+            .returning(StoredFile.path, StoredFile.refcount)
+        )
+        refcounts.update(result.all())
+
+    # Uploaded before content addressing: owned by a single product
+    return [path for path in dict.fromkeys(paths) if path not in refcounts]
+
+def remove_files(paths: List[str]):
+    """Delete image files and their variants. Blocking: runs in a worker thread."""
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"Deleted image file: {path}")
+            remove_variants(path)
+        except OSError as e:
+            logger.warning(f"Could not delete image file {path}: {str(e)}")
+
+async def purge_images(db: AsyncSession, paths: List[str]) -> List[str]:
+    """
+    Delete the files of paths whose stored_files row has no references left, with the rows.
+    Commits; call it after the transaction that released them. Files are unlinked while
+    the DELETE holds the rows, so a concurrent acquire_images either raised the refcount
+    first (the row is kept) or waits and then finds the file gone and writes it again.
+    Returns the paths removed.
+    """
+    if not paths:
+        return []
+    result = await db.execute(
+        delete(StoredFile)
+        .where(StoredFile.path.in_(set(paths)), StoredFile.refcount <= 0)
+        .returning(StoredFile.path)
+    )
+    removed = result.scalars().all()
+    try:
+        await run_in_threadpool(remove_files, removed)
+        await db.commit()
+    except BaseException:
+        # A row kept at refcount 0 without its file is harmless: acquire_images restores it
+        await db.rollback()
+        raise
+    return removed
+
+async def discard_images(images: List[StoredImage]):
+    """
+    Delete files written for a request that failed before acquiring them, unless
+    a stored_files row references them, in a transaction of its own
+    """
+    written = {image.sha256: image for image in images if image.written}
+    if not written:
+        return
+    async with async_session() as db:
+        # Claim files nobody has a row for with a refcount 0 row, so that a concurrent
+        # acquire_images of the same file waits for purge_images instead of racing it
+        await _upsert(db, [
+            {"sha256": sha256, "path": image.path, "size": image.size, "refcount": 0}
+            for sha256, image in sorted(written.items())
+        ], add_refcount=False)
+        await purge_images(db, [image.path for image in written.values()])
+
+# Serving
+
+# Content-addressed blobs and their variants: ab/<sha256>.<ext>[.w320.webp]
+BLOB_NAME_RE = re.compile(r"^[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})\.\w+(?P<variant>\.w\d+\.\w+)?$")
+# Date-folder uploads: 20250403/170338_name.jpeg[.w320.webp]
+DATED_NAME_RE = re.compile(r"^\d{8}/\d{6}_[^/]+$")
+VARIANT_SUFFIX_RE = re.compile(r"\.w\d+\.(webp|jpg)$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+def resolve_upload_path(relative_path: str) -> Optional[str]:
+    """
+    Map a URL path under /uploads to a file path, refusing anything outside UPLOAD_DIR
+    """
+    normalized = os.path.normpath(relative_path)
+    if normalized.startswith(("..", "/")) or "\\" in normalized or "\0" in normalized:
+        return None
+    return os.path.join(UPLOAD_DIR, normalized)
+
+def content_etag(relative_path: str) -> Optional[str]:
+    """
+    Strong ETag known from the name alone, for content-addressed files
+    """
+    match = BLOB_NAME_RE.match(relative_path)
+    if not match:
+        return None
+    return f'"{match.group("sha256")}{match.group("variant") or ""}"'
+
+def stat_etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def is_immutable(relative_path: str) -> bool:
+    """
+    Content-addressed and timestamped files are never rewritten under the same name
+    """
+    return bool(BLOB_NAME_RE.match(relative_path) or DATED_NAME_RE.match(relative_path))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags
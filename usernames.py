@@ -0,0 +1,87 @@
+"""
+Usernames for accounts created from a Google profile: the wanted name if it is
+free, otherwise base_N with N one past the highest suffix already in use.
+
+Taken names are read with one query on the unique username index (the name itself
+plus a prefix range over base_*), so the cost depends on how many users share the
+base, not on the size of the users table. Two requests can still pick the same
+name at once; the index rejects the second insert, which then allocates again.
+"""
+import re
+import logging
+from typing import Iterable, Optional
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User
+from prefixes import starts_with
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Inserts attempted before giving up on a heavily contended base name
+MAX_ATTEMPTS = 5
+
+# Unique index on users.username (models.py)
+USERNAME_INDEX = "ix_users_username"
+
+def base_username(name: str, email: str) -> str:
+    """Username wanted for a new account: the display name, or the email's local part"""
+    return name.replace(" ", "_").lower() if name else email.split("@")[0]
+
+def taken_usernames_query(dialect: str, base: str):
+    """SELECT of base and every username starting with base_"""
+    return select(User.username).where(or_(User.username == base, starts_with(dialect, User.username, f"{base}_")))
+
+def next_username(base: str, taken: Iterable[str]) -> str:
+    """base if it isn't taken, otherwise base_N past the highest taken suffix"""
+    taken = set(taken)
+    if base not in taken:
+        return base
+    suffix = re.compile(re.escape(base) + r"_(\d+)")
+    highest = 0
+    for name in taken:
+        match = suffix.fullmatch(name)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return f"{base}_{highest + 1}"
+
+async def allocate_username(db: AsyncSession, base: str) -> str:
+    taken = await db.scalars(taken_usernames_query(db.bind.dialect.name, base))
+    return next_username(base, taken)
+
+def constraint_name(error: IntegrityError) -> Optional[str]:
+    """Name of the violated constraint, for drivers that report it (Postgres)"""
+    # psycopg2 / psycopg: error.orig.diag; asyncpg: the driver error SQLAlchemy's adapter wraps
+    diag = getattr(error.orig, "diag", None)
+    for source in (diag, error.orig, getattr(error.orig, "__cause__", None)):
+        name = getattr(source, "constraint_name", None)
+        if name:
+            return name
+    return None
+
+def is_username_conflict(error: IntegrityError) -> bool:
+    name = constraint_name(error)
+    if name is not None:
+        return name == USERNAME_INDEX
+    # SQLite names the column: "UNIQUE constraint failed: users.username"
+    return "users.username" in str(error.orig)
+
+async def add_user(db: AsyncSession, base: str, **fields) -> User:
+    """
+    Insert and commit a user named base or base_N. Allocates again when a
+    concurrent insert takes the name first; other integrity errors are raised.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        username = await allocate_username(db, base)
+        user = User(username=username, **fields)
+        db.add(user)
+        try:
+            await db.commit()
+            return user
+        except IntegrityError as e:
+            await db.rollback()
+            if attempt == MAX_ATTEMPTS or not is_username_conflict(e):
+                raise
+            logger.info(f"Username {username} was taken by a concurrent signup, allocating again")